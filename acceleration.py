@@ -0,0 +1,152 @@
+import numpy as np
+
+# Tolerance of the barycentric coordinates, so rays through an edge still hit
+BARYCENTRIC_TOLERANCE = 1e-9
+
+
+def build_tree(corners, leaf_size=4):
+    """Build a median-split hierarchy over primitives given by their (P,K,3) corner points.
+
+    Returns the flat node arrays ``bounds_min``, ``bounds_max``, ``left``,
+    ``right``, ``start`` and ``count`` and the reordered ``primitives``.
+    """
+    bounds_min, bounds_max, left, right, start, count = [], [], [], [], [], []
+    primitives = []
+    centroids = corners.mean(axis=1)
+
+    def build(indices):
+        node = len(bounds_min)
+        points = corners[indices].reshape(-1, 3)
+        bounds_min.append(points.min(axis=0))
+        bounds_max.append(points.max(axis=0))
+        left.append(-1)
+        right.append(-1)
+        start.append(len(primitives))
+        count.append(0)
+        if len(indices) <= leaf_size:
+            primitives.extend(indices)
+            count[node] = len(indices)
+            return node
+        # Teilung am Median der laengsten Achse der Schwerpunkte
+        extent = centroids[indices].max(axis=0) - centroids[indices].min(axis=0)
+        axis = np.argmax(extent)
+        order = indices[np.argsort(centroids[indices, axis], kind="stable")]
+        half = len(order) // 2
+        left[node] = build(order[:half])
+        right[node] = build(order[half:])
+        return node
+
+    build(np.arange(len(corners)))
+    return (
+        np.array(bounds_min),
+        np.array(bounds_max),
+        np.array(left),
+        np.array(right),
+        np.array(start),
+        np.array(count),
+        np.array(primitives, dtype=np.int64),
+    )
+
+
+class BVH:
+    """Bounding volume hierarchy over the triangles of a mesh, in pure NumPy.
+
+    The tree is stored in flat arrays. Inner nodes reference their two
+    children, leaves reference a range of ``primitives``. Queries traverse
+    the tree for a whole batch of rays at once, level by level.
+    """
+
+    def __init__(self, triangles, leaf_size=4):
+        self.triangles = np.ascontiguousarray(triangles, dtype=float)
+        self.leaf_size = leaf_size
+        self.v0 = self.triangles[:, 0]
+        self.e1 = self.triangles[:, 1] - self.v0
+        self.e2 = self.triangles[:, 2] - self.v0
+
+        (
+            self.bounds_min,
+            self.bounds_max,
+            self.left,
+            self.right,
+            self.start,
+            self.count,
+            self.primitives,
+        ) = build_tree(self.triangles, leaf_size)
+
+    def __len__(self):
+        return len(self.bounds_min)
+
+    def intersect_triangles(self, origins, directions, face_ids):
+        """Moeller-Trumbore test of ray/triangle pairs, returns the distances (inf on miss)."""
+        e1, e2 = self.e1[face_ids], self.e2[face_ids]
+        p = np.cross(directions, e2)
+        det = np.einsum("ij,ij->i", e1, p)
+        # Nur nicht-parallele Paare teilen; parallele bekommen 0 und fallen im hit-Test heraus
+        valid = np.abs(det) > 1e-12
+        inv_det = np.zeros_like(det)
+        inv_det[valid] = 1.0 / det[valid]
+        s = origins - self.v0[face_ids]
+        u = np.einsum("ij,ij->i", s, p) * inv_det
+        q = np.cross(s, e1)
+        v = np.einsum("ij,ij->i", directions, q) * inv_det
+        t = np.einsum("ij,ij->i", e2, q) * inv_det
+        hit = (
+            valid
+            & (u >= -BARYCENTRIC_TOLERANCE)
+            & (v >= -BARYCENTRIC_TOLERANCE)
+            & (u + v <= 1 + BARYCENTRIC_TOLERANCE)
+            & (t > 0)
+        )
+        return np.where(hit, t, np.inf)
+
+    def intersect_first(self, origins, directions):
+        """Find the first hit of every ray.
+
+        Returns the (N,3) hit locations, the (N,) face indices and the (N,)
+        distances along the unit directions. Rays that miss the mesh get
+        face index -1 and NaN locations and distances.
+        """
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        directions = directions / np.linalg.norm(directions, axis=1)[:, np.newaxis]
+        n = len(origins)
+        inv_directions = 1.0 / np.where(directions == 0, 1e-300, directions)
+
+        best_t = np.full(n, np.inf)
+        best_face = np.full(n, -1, dtype=np.int64)
+        ray_ids = np.arange(n)
+        nodes = np.zeros(n, dtype=np.int64)
+
+        while ray_ids.size:
+            # Slab-Test gegen die Boxen der aktuellen Knoten
+            t0 = (self.bounds_min[nodes] - origins[ray_ids]) * inv_directions[ray_ids]
+            t1 = (self.bounds_max[nodes] - origins[ray_ids]) * inv_directions[ray_ids]
+            t_near = np.minimum(t0, t1).max(axis=1)
+            t_far = np.maximum(t0, t1).min(axis=1)
+            keep = (t_far >= np.maximum(t_near, 0)) & (t_near <= best_t[ray_ids])
+            ray_ids, nodes = ray_ids[keep], nodes[keep]
+
+            leaf = self.count[nodes] > 0
+            leaf_rays, leaf_nodes = ray_ids[leaf], nodes[leaf]
+            if leaf_rays.size:
+                counts = self.count[leaf_nodes]
+                pair_rays = np.repeat(leaf_rays, counts)
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                pair_faces = self.primitives[np.repeat(self.start[leaf_nodes], counts) + offsets]
+                t = self.intersect_triangles(origins[pair_rays], directions[pair_rays], pair_faces)
+                closer = t < best_t[pair_rays]
+                pair_rays, pair_faces, t = pair_rays[closer], pair_faces[closer], t[closer]
+                # Bei mehreren Treffern pro Strahl gewinnt der zuletzt geschriebene,
+                # also nach absteigender Distanz sortieren
+                order = np.argsort(-t, kind="stable")
+                best_t[pair_rays[order]] = t[order]
+                best_face[pair_rays[order]] = pair_faces[order]
+
+            inner_rays, inner_nodes = ray_ids[~leaf], nodes[~leaf]
+            ray_ids = np.concatenate((inner_rays, inner_rays))
+            nodes = np.concatenate((self.left[inner_nodes], self.right[inner_nodes]))
+
+        missed = best_face < 0
+        best_t[missed] = np.nan
+        locations = origins + best_t[:, np.newaxis] * directions
+        return locations, best_face, best_t
@@ -0,0 +1,191 @@
+import warnings
+from statistics import NormalDist
+import numpy as np
+from path_store import PathStore
+from sampling import DirectionSampler
+
+# Without a ray limit, sampling ends after this many times initial_rays
+DEFAULT_MAX_RAYS_FACTOR = 100
+
+
+def default_max_rays(room, max_rays=None):
+    """The ray limit of a room, DEFAULT_MAX_RAYS_FACTOR times initial_rays if none is given."""
+    if max_rays is None:
+        max_rays = DEFAULT_MAX_RAYS_FACTOR * room.initial_rays
+    return max_rays
+
+
+def warn_ray_limit(room, rays_traced):
+    """Count and warn that sampling stopped at the ray limit before its stopping rule was met."""
+    room.instrumentation.count("ray_limit_reached")
+    warnings.warn(
+        f"Stopped after {rays_traced} rays without meeting the stopping rule; "
+        "the target may be unreachable from the source.",
+        RuntimeWarning,
+        stacklevel=3,
+    )
+
+
+def sample_cones(centers, center_weights, cos_angle, n, rng):
+    """Draw n directions uniformly inside spherical caps around centers drawn by weight."""
+    center = centers[rng.choice(len(centers), size=n, p=center_weights)]
+    cos_theta = 1 - rng.random(n) * (1 - cos_angle)
+    sin_theta = np.sqrt(1 - cos_theta**2)
+    phi = 2 * np.pi * rng.random(n)
+
+    # Orthonormale Basis um jede Kegelachse
+    helper = np.where(np.abs(center[:, :1]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]])
+    u = np.cross(center, helper)
+    u /= np.linalg.norm(u, axis=1)[:, np.newaxis]
+    v = np.cross(center, u)
+    return (
+        cos_theta[:, np.newaxis] * center
+        + (sin_theta * np.cos(phi))[:, np.newaxis] * u
+        + (sin_theta * np.sin(phi))[:, np.newaxis] * v
+    )
+
+
+class AdaptiveSampler:
+    """Traces rays in batches, focusing new rays on the directions that hit the target.
+
+    The first ``initial_rays`` come from the room's sampler. Afterwards a
+    fraction of every batch is drawn inside cones around the initial
+    directions of rays that hit the target, the rest from the sampler as
+    before. Every order that has hits gets the same share of the cone rays,
+    and the cones narrow as more rays are traced. Every ray of such a batch
+    gets the weight p(d) / q(d) of the uniform density over the mixture
+    density it was drawn from, which is passed to the tracer as its initial
+    energy. Weighted sums over all batches are therefore unbiased estimates
+    for ``rays_traced`` uniform rays, and all batches are kept.
+
+    Sampling stops once every order has ``hits_per_order`` paths, once the
+    confidence interval of the hit probability of every order is within
+    ``relative_error`` of the estimate, or after ``max_rays`` rays. Without
+    a stopping rule it stops at the first hit after ``initial_rays``. The
+    ray limit always applies, by default DEFAULT_MAX_RAYS_FACTOR times
+    ``initial_rays``; reaching it returns the paths found so far, possibly
+    none, and warns.
+    """
+
+    def __init__(
+        self,
+        room,
+        batch_size=None,
+        hits_per_order=None,
+        relative_error=None,
+        confidence=0.95,
+        max_rays=None,
+        cone_fraction=0.5,
+        cone_angle=None,
+        max_cones=512,
+        rng=None,
+    ):
+        self.room = room
+        self.batch_size = batch_size or room.initial_rays
+        self.hits_per_order = hits_per_order
+        self.relative_error = relative_error
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.max_rays = default_max_rays(room, max_rays)
+        self.cone_fraction = cone_fraction
+        self.cone_angle = cone_angle
+        self.max_cones = max_cones
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.sampler = DirectionSampler(room.sampler, self.rng)
+
+        num_orders = room.order + 1
+        self.rays_traced = 0
+        self.hits = np.zeros(num_orders, dtype=np.int64)
+        self.weight_sums = np.zeros(num_orders)
+        self.squared_weight_sums = np.zeros(num_orders)
+        self.centers = np.zeros((0, 3))
+        self.center_orders = np.zeros(0, dtype=np.int64)
+
+    def hit_probability(self):
+        """Estimated probability of a uniform ray to reach the target, per order."""
+        return self.weight_sums / max(self.rays_traced, 1)
+
+    def standard_error(self):
+        """Standard error of hit_probability, per order."""
+        n = max(self.rays_traced, 1)
+        p = self.hit_probability()
+        return np.sqrt(np.maximum(self.squared_weight_sums / n - p**2, 0.0) / n)
+
+    def converged(self):
+        """Whether the stopping rule is met."""
+        if self.rays_traced < self.room.initial_rays:
+            return False
+        if self.hits_per_order is not None and (self.hits >= self.hits_per_order).all():
+            return True
+        if self.relative_error is not None:
+            p = self.hit_probability()
+            return bool((p > 0).all() and (self.z * self.standard_error() <= self.relative_error * p).all())
+        if self.hits_per_order is None:
+            return bool(self.hits.any())
+        return False
+
+    def cos_angle(self):
+        """Cosine of the cone half-angle for the next batch."""
+        cone_angle = self.cone_angle
+        if cone_angle is None:
+            # Etwa zwei Strahlabstaende aller bisher geschossenen Strahlen
+            cone_angle = 2 * np.sqrt(4 * np.pi / self.rays_traced)
+        return np.cos(min(cone_angle, np.pi))
+
+    def draw(self, n):
+        """Draw n directions and their weights relative to uniform sampling."""
+        if self.rays_traced < self.room.initial_rays or not len(self.centers):
+            return self.sampler.sample(n), np.ones(n)
+        cos_angle = self.cos_angle()
+        # Jede Ordnung mit Treffern bekommt denselben Anteil der Kegelstrahlen
+        counts = np.bincount(self.center_orders)
+        center_weights = 1 / (counts[self.center_orders] * np.count_nonzero(counts))
+
+        n_cones = int(round(self.cone_fraction * n))
+        directions = np.concatenate(
+            [
+                self.sampler.sample(n - n_cones),
+                sample_cones(self.centers, center_weights, cos_angle, n_cones, self.rng),
+            ]
+        )
+        # Dichte der Mischung relativ zur Gleichverteilung auf der Kugel
+        inside = (directions @ self.centers.T >= cos_angle) @ center_weights
+        cap_share = 2 / (1 - cos_angle)
+        density = (n - n_cones) / n + n_cones / n * inside * cap_share
+        return directions, 1 / density
+
+    def update(self, store, n):
+        """Add a traced batch to the estimates and to the cone centers."""
+        self.rays_traced += n
+        if not len(store):
+            return
+        orders = store.path_orders()
+        weights = store.segments["energy"][store.starts]
+        num_orders = len(self.hits)
+        self.hits += np.bincount(orders, minlength=num_orders)
+        self.weight_sums += np.bincount(orders, weights=weights, minlength=num_orders)
+        self.squared_weight_sums += np.bincount(orders, weights=weights**2, minlength=num_orders)
+
+        centers = np.concatenate([self.centers, store.segments["direction"][store.starts]])
+        center_orders = np.concatenate([self.center_orders, orders])
+        if len(centers) > self.max_cones:
+            keep = self.rng.choice(len(centers), self.max_cones, replace=False)
+            centers, center_orders = centers[keep], center_orders[keep]
+        self.centers, self.center_orders = centers, center_orders
+
+    def run(self):
+        """Trace batches until the stopping rule is met and return all hit paths."""
+        room = self.room
+        instrumentation = room.instrumentation
+        stores = []
+        while not self.converged():
+            if self.rays_traced >= self.max_rays:
+                warn_ray_limit(room, self.rays_traced)
+                break
+            n = min(self.batch_size, self.max_rays - self.rays_traced)
+            directions, weights = self.draw(n)
+            origins = np.tile(room.source, (n, 1))
+            store = room.trace_rays(origins, directions, weights, rng=self.rng)
+            self.update(store, n)
+            instrumentation.count("batches")
+            stores.append(store)
+        return PathStore.concatenate(stores, room.order)
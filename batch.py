@@ -0,0 +1,61 @@
+import numpy as np
+from mirror_image_method import MirrorImageMethod
+from sampling import sample_directions
+
+
+class BatchSimulation:
+    """Simulates every pair of a set of sources and a set of targets on one mesh.
+
+    The mesh, its face geometry and the ray backend are loaded once. The
+    image-source tree is built once per source, and each traced ray front is
+    tested against all targets at the same time.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        sources: np.ndarray,
+        targets: list,
+        order: int,
+        reflection_coefficient: float,
+        initial_rays: int,
+        mode: str = "stochastic",
+        sampler: str = "random",
+        ray_backend: str = "auto",
+        seed: int = None,
+        cache=None,
+    ):
+        self.sources = np.atleast_2d(np.asarray(sources, dtype=float))
+        self.targets = list(targets)
+        self.seed = seed
+        self.room = MirrorImageMethod(
+            file_path,
+            self.sources[0],
+            self.targets[0],
+            order,
+            reflection_coefficient,
+            initial_rays,
+            mode=mode,
+            sampler=sampler,
+            ray_backend=ray_backend,
+            compute_paths=False,
+            cache=cache,
+        )
+
+    def run(self):
+        """Simulate all pairs and return a dict of PathStores keyed by (source, target) index."""
+        room = self.room
+        seeds = np.random.SeedSequence(self.seed).spawn(len(self.sources))
+        results = {}
+        for source_id, source in enumerate(self.sources):
+            room.set_source(source)
+            if room.mode == "deterministic":
+                stores = [room.calculate_image_source_paths(target) for target in self.targets]
+            else:
+                rng = np.random.default_rng(seeds[source_id])
+                directions = sample_directions(room.sampler, room.initial_rays, rng)
+                origins = np.tile(source, (room.initial_rays, 1))
+                stores = room.trace_rays(origins, directions, 1.0, self.targets)
+            for target_id, store in enumerate(stores):
+                results[source_id, target_id] = store
+        return results
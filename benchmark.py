@@ -0,0 +1,163 @@
+import argparse
+import glob
+import json
+import time
+import tracemalloc
+import numpy as np
+from acceleration import BVH
+from impulse_response import ImpulseResponse
+from mirror_image_method import RAY_BACKENDS, MirrorImageMethod
+from preprocessing import load_room
+from utils import Target
+
+
+def compare_ray_backends(mesh_files, n_rays=10000, repeats=3, seed=0):
+    """Time batched first-hit queries of the BVH against the trimesh backend."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for file_path in mesh_files:
+        mesh, geometry, _ = load_room(file_path)
+
+        start = time.perf_counter()
+        bvh = BVH(geometry.triangles)
+        build_time = time.perf_counter() - start
+
+        # Strahlen aus dem Inneren der Bounding Box in zufaellige Richtungen
+        low, high = mesh.bounds
+        center, extent = (low + high) / 2, (high - low) / 4
+        origins = rng.uniform(center - extent, center + extent, (n_rays, 3))
+        directions = rng.normal(size=(n_rays, 3))
+        directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+        bvh_times, trimesh_times = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _, bvh_faces, _ = bvh.intersect_first(origins, directions)
+            bvh_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _, index_ray, index_triangle = mesh.ray.intersects_location(
+                origins, directions, multiple_hits=False
+            )
+            trimesh_times.append(time.perf_counter() - start)
+
+        trimesh_faces = np.full(n_rays, -1)
+        trimesh_faces[index_ray] = index_triangle
+        results.append(
+            {
+                "mesh": file_path,
+                "faces": len(mesh.faces),
+                "rays": n_rays,
+                "bvh_build": build_time,
+                "bvh": min(bvh_times),
+                "trimesh": min(trimesh_times),
+                "agreement": float(np.mean(bvh_faces == trimesh_faces)),
+            }
+        )
+    return results
+
+
+def benchmark_pipeline(file_path, order, n_rays, seed=0, radius=0.5, ray_backend="auto"):
+    """Time the phases of one stochastic simulation separately.
+
+    The mesh is loaded once by the room that traces, and the mesh load and
+    image-source phases are taken from its instrumentation, so they include
+    the acceleration structure of the ray backend actually used. The source
+    and target sit at fixed fractions of the mesh bounds, so runs on the
+    same mesh are comparable. Returns the phase timings in seconds, rays per
+    second of the tracing phase and the peak traced memory in bytes.
+    """
+    tracemalloc.start()
+    room = MirrorImageMethod(
+        file_path,
+        None,
+        None,
+        order,
+        1.0,
+        n_rays,
+        ray_backend=ray_backend,
+        compute_paths=False,
+        instrument=True,
+    )
+    low, high = room.mesh.bounds
+    room.set_source(low + (high - low) * np.array([0.3, 0.4, 0.35]))
+    room.set_target(Target(low + (high - low) * np.array([0.7, 0.6, 0.65]), radius))
+
+    tree = room.image_sources
+    start = time.perf_counter()
+    store = room.trace_chunk(n_rays, seed)
+    trace_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store.calculate_total_travel_time()
+    store.calculate_energy_loss_of_all()
+    store.group_by_order()
+    ImpulseResponse.from_paths(store)
+    aggregation_time = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = room.instrumentation.timings
+    return {
+        "mesh": file_path,
+        "order": order,
+        "rays": n_rays,
+        "ray_backend": room.ray_backend,
+        "faces": len(room.geometry),
+        "polygons": len(room.geometry.polygons),
+        "image_sources": len(tree),
+        "paths": len(store),
+        "mesh_load": timings["mesh_load"],
+        "image_sources_time": timings["image_sources"],
+        "ray_tracing": trace_time,
+        "path_aggregation": aggregation_time,
+        "rays_per_second": n_rays / trace_time,
+        "peak_memory": peak_memory,
+    }
+
+
+def run_matrix(mesh_files, orders, ray_counts, seed=0, ray_backend="auto"):
+    """Run benchmark_pipeline for every combination of mesh, order and ray count."""
+    return [
+        benchmark_pipeline(file_path, order, n_rays, seed, ray_backend=ray_backend)
+        for file_path in mesh_files
+        for order in orders
+        for n_rays in ray_counts
+    ]
+
+
+def print_backend_comparison(mesh_files):
+    print(f"{'mesh':<22}{'faces':>6}{'build':>10}{'bvh':>10}{'trimesh':>10}{'speedup':>9}{'agree':>8}")
+    for result in compare_ray_backends(mesh_files):
+        print(
+            f"{result['mesh']:<22}{result['faces']:>6}"
+            f"{result['bvh_build']:>10.4f}{result['bvh']:>10.4f}{result['trimesh']:>10.4f}"
+            f"{result['trimesh'] / result['bvh']:>8.1f}x{result['agreement']:>8.3f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation pipeline.")
+    parser.add_argument("--meshes", nargs="+", default=sorted(glob.glob("./model/*.obj")))
+    parser.add_argument("--orders", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--rays", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ray-backend", choices=("auto",) + RAY_BACKENDS, default="auto", help="ray backend of the traced room")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--backends", action="store_true", help="compare the BVH with the trimesh backend")
+    args = parser.parse_args(argv)
+
+    if args.backends:
+        print_backend_comparison(args.meshes)
+        return
+
+    report = json.dumps(run_matrix(args.meshes, args.orders, args.rays, args.seed, args.ray_backend), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import numpy as np
+import numpy.linalg as lin
+from path_store import PathStore
+
+# Allowed deviation of a normal from an axis and of a vertex from its wall,
+# relative to the size of the room
+BOX_TOLERANCE = 1e-9
+
+
+class BoxRoom:
+    """An axis-aligned rectangular room, detected from the faces of a mesh.
+
+    Walls are numbered ``2 * axis`` for the lower and ``2 * axis + 1`` for
+    the upper wall of each axis. Unfolded along an axis, the room repeats
+    every room length, and the n-th copy is mirrored for odd n. The image
+    sources therefore form a regular lattice, and the specular paths of any
+    order are computed in closed form instead of by back-tracing a tree.
+    """
+
+    def __init__(self, geometry, low, high, face_walls):
+        self.geometry = geometry
+        self.low = low
+        self.high = high
+        self.size = high - low
+        self.face_walls = face_walls
+        self.wall_faces = [np.flatnonzero(face_walls == wall) for wall in range(6)]
+
+    @classmethod
+    def from_geometry(cls, geometry, tolerance=BOX_TOLERANCE):
+        """Return the BoxRoom of a geometry, or None if it is not an axis-aligned box.
+
+        Every face has to lie in one of the six bounding planes with an
+        axis-aligned normal, and the faces of every wall have to add up to
+        the area of the full rectangle.
+        """
+        triangles = geometry.triangles
+        low = triangles.reshape(-1, 3).min(axis=0)
+        high = triangles.reshape(-1, 3).max(axis=0)
+        size = high - low
+        scale = size.max()
+        if not len(triangles) or (size <= tolerance * scale).any():
+            return None
+
+        faces = np.arange(len(triangles))
+        axes = np.abs(geometry.normals).argmax(axis=1)
+        if not (np.abs(np.abs(geometry.normals[faces, axes]) - 1) <= tolerance).all():
+            return None
+        coordinates = triangles[faces, :, axes]
+        on_low = (np.abs(coordinates - low[axes, np.newaxis]) <= tolerance * scale).all(axis=1)
+        on_high = (np.abs(coordinates - high[axes, np.newaxis]) <= tolerance * scale).all(axis=1)
+        if not (on_low | on_high).all():
+            return None
+        face_walls = 2 * axes + on_high
+
+        areas = lin.norm(
+            np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1
+        ) / 2
+        wall_areas = np.bincount(face_walls, weights=areas, minlength=6)
+        rectangle_areas = np.repeat(np.prod(size) / size, 2)
+        if not np.allclose(wall_areas, rectangle_areas, rtol=1e-6):
+            return None
+        return cls(geometry, low, high, face_walls)
+
+    def contains(self, points, strict=False):
+        """Check whether points lie inside the room (walls included unless strict)."""
+        points = np.atleast_2d(points)
+        if strict:
+            return ((points > self.low) & (points < self.high)).all(axis=1)
+        return ((points >= self.low) & (points <= self.high)).all(axis=1)
+
+    def face_on_wall(self, points, walls):
+        """Return the triangle of its wall that contains every point."""
+        face_indices = np.full(len(points), -1)
+        for wall, candidates in enumerate(self.wall_faces):
+            on_wall = np.flatnonzero(walls == wall)
+            for face in candidates:
+                if not on_wall.size:
+                    break
+                inside = self.geometry.contains(points[on_wall], np.full(len(on_wall), face))
+                face_indices[on_wall[inside]] = face
+                on_wall = on_wall[~inside]
+            # Rundungsfehler am Rand: die erste Flaeche der Wand nehmen
+            if on_wall.size:
+                face_indices[on_wall] = candidates[0]
+        return face_indices
+
+    def intersect_first(self, origins, directions):
+        """Return the first wall hit of every ray leaving a point inside the room.
+
+        Same layout as ``BVH.intersect_first``: locations, faces and
+        distances, with -1 and NaN for rays that do not start inside the room.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bounds = np.where(directions > 0, self.high, self.low)
+            t = np.where(directions != 0, (bounds - origins) / directions, np.inf)
+        axes = t.argmin(axis=1)
+        rows = np.arange(len(origins))
+        distances = t[rows, axes]
+        hit = self.contains(origins) & np.isfinite(distances)
+
+        locations = origins + distances[:, np.newaxis] * directions
+        # Auf der getroffenen Wand liegt der Punkt exakt in ihrer Ebene
+        locations[rows, axes] = bounds[rows, axes]
+        walls = 2 * axes + (directions[rows, axes] > 0)
+        face_indices = np.full(len(origins), -1)
+        face_indices[hit] = self.face_on_wall(locations[hit], walls[hit])
+        locations[~hit] = np.nan
+        distances = np.where(hit, distances, np.nan)
+        return locations, face_indices, distances
+
+    @staticmethod
+    def lattice(order):
+        """Return the lattice indices (nx, ny, nz) with |nx| + |ny| + |nz| == order."""
+        r = np.arange(-order, order + 1)
+        nx, ny = (values.ravel() for values in np.meshgrid(r, r, indexing="ij"))
+        rest = order - np.abs(nx) - np.abs(ny)
+        valid = rest >= 0
+        nx, ny, rest = nx[valid], ny[valid], rest[valid]
+        two_sided = rest > 0
+        return np.concatenate(
+            [
+                np.stack((nx, ny, rest), axis=1),
+                np.stack((nx[two_sided], ny[two_sided], -rest[two_sided]), axis=1),
+            ]
+        )
+
+    def image_positions(self, source, indices):
+        """Position of the image source with the given lattice indices."""
+        source = np.asarray(source, dtype=float)
+        mirrored = np.where(indices % 2 == 0, source - self.low, self.high - source)
+        return indices * self.size + self.low + mirrored
+
+    def image_sources(self, source, order):
+        """Return the positions and orders of all distinct image sources up to order."""
+        indices = [self.lattice(current_order) for current_order in range(order + 1)]
+        orders = np.repeat(np.arange(order + 1), [len(i) for i in indices])
+        return self.image_positions(source, np.concatenate(indices)), orders
+
+    def fold(self, points):
+        """Map points of the unfolded space back into the room."""
+        u = np.mod(points - self.low, 2 * self.size)
+        return self.low + np.where(u <= self.size, u, 2 * self.size - u)
+
+    def image_source_paths(self, source, receiver, order, reflection, min_order=0):
+        """Return every specular path of min_order up to order as a PathStore.
+
+        The straight line from an image source to the receiver crosses one
+        wall plane per reflection; the crossings sorted along the line are
+        the reflections in the order of the path, and folding them back into
+        the room gives the reflection points. ``reflection`` holds the
+        reflection coefficients of every face per band.
+        """
+        receiver = np.asarray(receiver, dtype=float)
+        stores = []
+        for current_order in range(min_order, order + 1):
+            indices = self.lattice(current_order)
+            images = self.image_positions(source, indices)
+            count = len(images)
+
+            # Parameter der Ebenendurchgaenge je Achse, von der Bildquelle aus
+            crossings = np.arange(current_order)
+            planes = np.where(
+                indices[:, :, np.newaxis] > 0,
+                indices[:, :, np.newaxis] - crossings,
+                indices[:, :, np.newaxis] + 1 + crossings,
+            )
+            crossed = crossings < np.abs(indices)[:, :, np.newaxis]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = (self.low[:, np.newaxis] + planes * self.size[:, np.newaxis] - images[:, :, np.newaxis]) / (
+                    receiver[:, np.newaxis] - images[:, :, np.newaxis]
+                )
+            t = np.where(crossed, t, np.inf).reshape(count, -1)
+            sequence = np.argsort(t, axis=1, kind="stable")[:, :current_order]
+            t = np.take_along_axis(t, sequence, axis=1)
+            axes = sequence // current_order if current_order else sequence
+            planes = np.take_along_axis(planes.reshape(count, -1), sequence, axis=1)
+            walls = 2 * axes + (planes % 2)
+
+            unfolded = images[:, np.newaxis] + t[..., np.newaxis] * (receiver - images)[:, np.newaxis]
+            reflection_points = self.fold(unfolded)
+            # Der Punkt liegt exakt auf seiner Wand
+            rows = np.arange(count)[:, np.newaxis]
+            wall_coordinates = np.where(planes % 2 == 0, self.low[axes], self.high[axes])
+            reflection_points[rows, np.arange(current_order), axes] = wall_coordinates
+            faces = self.face_on_wall(reflection_points.reshape(-1, 3), walls.ravel()).reshape(
+                count, current_order
+            )
+
+            points = np.concatenate(
+                [
+                    np.broadcast_to(np.asarray(source, dtype=float), (count, 1, 3)),
+                    reflection_points,
+                    np.broadcast_to(receiver, (count, 1, 3)),
+                ],
+                axis=1,
+            )
+            energy = np.ones((count, current_order + 1, reflection.shape[1]))
+            if current_order:
+                energy[:, 1:] = np.cumprod(reflection[faces], axis=1)
+
+            is_last = np.arange(current_order + 1) == current_order
+            nan_points = np.full((count, current_order + 1, 3), np.nan)
+            segment_faces = np.full((count, current_order + 1), -1)
+            segment_faces[:, :-1] = faces
+            stores.append(
+                PathStore.from_arrays(
+                    order,
+                    path=np.repeat(np.arange(count), current_order + 1),
+                    order=np.tile(np.arange(current_order + 1), count),
+                    origin=points[:, :-1].reshape(-1, 3),
+                    direction=(points[:, 1:] - points[:, :-1]).reshape(-1, 3),
+                    reflection_point=np.where(
+                        is_last[:, np.newaxis], nan_points, points[:, 1:]
+                    ).reshape(-1, 3),
+                    hit_location=np.where(
+                        is_last[:, np.newaxis], points[:, 1:], nan_points
+                    ).reshape(-1, 3),
+                    face_index=segment_faces.ravel(),
+                    energy=energy.reshape(-1, reflection.shape[1]),
+                )
+            )
+        return PathStore.concatenate(stores, order)
+
+    def __repr__(self):
+        return f"BoxRoom from {self.low} to {self.high}."
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import numpy as np
+import trimesh
+from geometry import FaceGeometry
+from image_sources import ImageSourceTree
+from path_store import PathStore
+from preprocessing import MeshReport, check_watertight, load_room
+
+# Default upper bound of the cache directory in bytes
+DEFAULT_MAX_BYTES = 256 * 1024**2
+
+# Part of every entry name; raised when the layout or meaning of entries changes
+CACHE_VERSION = 2
+
+
+def file_hash(file_path):
+    """Return the SHA-256 hash of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class GeometryCache:
+    """Content-addressed on-disk cache of preprocessed meshes, image-source trees and paths.
+
+    Entries are uncompressed ``.npz`` files named after the hash of the mesh
+    file, plus the source position and order for image sources, or a key of
+    the simulation parameters for paths. A changed
+    mesh file gets a new hash and therefore new entries. When the directory
+    grows above ``max_bytes``, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory=".cache", max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".npz")
+
+    def _read(self, name):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        # Zugriffszeit fuer die LRU-Verdraengung aktualisieren
+        os.utime(path)
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    def _write(self, name, arrays):
+        path = self._path(name)
+        # Eigene temporaere Datei je Prozess, falls mehrere Worker gleichzeitig schreiben
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, **arrays)
+        os.replace(temporary, path)
+        self.evict()
+
+    def load_mesh(self, file_path):
+        """Return the preprocessed mesh, its face geometry and MeshReport.
+
+        The OBJ file is only loaded and preprocessed on a miss.
+        """
+        name = f"mesh-v{CACHE_VERSION}-{file_hash(file_path)}"
+        arrays = self._read(name)
+        if arrays is None:
+            mesh, geometry, report = load_room(file_path)
+            arrays = {
+                "vertices": mesh.vertices,
+                "faces": mesh.faces,
+                "triangles": geometry.triangles,
+                "normals": geometry.normals,
+                "centroids": geometry.centroids,
+                "offsets": geometry.offsets,
+                "orientation": geometry.orientation,
+                "face_polygons": geometry.face_polygons,
+                "report": report.as_array(),
+            }
+            self._write(name, arrays)
+            return mesh, geometry, report
+        mesh = trimesh.Trimesh(arrays["vertices"], arrays["faces"], process=False)
+        geometry = FaceGeometry(
+            arrays["triangles"],
+            arrays["normals"],
+            arrays["centroids"],
+            arrays["offsets"],
+            float(arrays["orientation"]),
+            arrays["face_polygons"],
+        )
+        report = MeshReport.from_array(arrays["report"])
+        check_watertight(report, file_path)
+        return mesh, geometry, report
+
+    def load_image_sources(self, file_path, source, order, build):
+        """Return the image-source tree of a source, calling build() only on a miss."""
+        source = np.asarray(source, dtype=float)
+        source_hash = hashlib.sha256(source.tobytes()).hexdigest()[:16]
+        name = f"images-v{CACHE_VERSION}-{file_hash(file_path)}-{source_hash}-{order}"
+        arrays = self._read(name)
+        if arrays is None:
+            tree = build()
+            self._write(
+                name,
+                {
+                    "positions": tree.positions,
+                    "parents": tree.parents,
+                    "faces": tree.faces,
+                    "orders": tree.orders,
+                },
+            )
+            return tree
+        return ImageSourceTree(
+            arrays["positions"], arrays["parents"], arrays["faces"], arrays["orders"]
+        )
+
+    def load_paths(self, file_path, key, compute):
+        """Return the PathStore of a simulation, calling compute() only on a miss.
+
+        ``key`` identifies the simulation parameters; the entry is stored
+        under the mesh hash as well, so invalidate(file_path) removes it.
+        """
+        name = f"paths-v{CACHE_VERSION}-{file_hash(file_path)}-{key}"
+        arrays = self._read(name)
+        if arrays is None:
+            store = compute()
+            self._write(
+                name,
+                {
+                    "segments": store.segments,
+                    "band_energy": store.band_energy,
+                    "max_order": store.max_order,
+                },
+            )
+            return store
+        return PathStore(arrays["segments"], int(arrays["max_order"]), arrays["band_energy"])
+
+    def entries(self):
+        """Return the paths of all cache entries, least recently used first."""
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".npz") and not name.endswith(".tmp.npz")
+        ]
+        return sorted(paths, key=os.path.getmtime)
+
+    def size(self):
+        """Return the total size of all entries in bytes."""
+        return sum(os.path.getsize(path) for path in self.entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits into max_bytes."""
+        entries = self.entries()
+        total = sum(os.path.getsize(path) for path in entries)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def invalidate(self, file_path=None):
+        """Remove the entries of one mesh file, or all entries when no file is given."""
+        mesh_hash = file_hash(file_path) if file_path is not None else None
+        for path in self.entries():
+            if mesh_hash is None or mesh_hash in os.path.basename(path):
+                os.remove(path)
@@ -0,0 +1,135 @@
+import json
+import os
+import numpy as np
+from image_sources import ImageSourceTree
+from path_store import PathStore, SEGMENT_DTYPE
+
+# One row per exported path
+PATH_DTYPE = np.dtype(
+    [
+        ("order", np.int64),
+        ("travel_time", np.float64),
+        ("energy_loss", np.float64),
+    ]
+)
+
+IMAGE_SOURCE_FIELDS = ("positions", "parents", "faces", "orders")
+
+
+class ResultWriter:
+    """Writes simulation results as raw binary columns into a directory.
+
+    Path batches are appended to ``segments.bin``, ``band_energy.bin`` and
+    ``paths.bin`` as they arrive, so a stream from ``iter_paths`` can be written with bounded
+    memory. Image sources are stored as ``.npy`` files. ``close`` writes
+    ``metadata.json``; use the writer as a context manager.
+    """
+
+    def __init__(self, directory, max_order, speed_of_sound=343.0):
+        self.directory = directory
+        self.max_order = max_order
+        self.speed_of_sound = speed_of_sound
+        self.path_count = 0
+        self.segment_count = 0
+        self.num_bands = None
+        os.makedirs(directory, exist_ok=True)
+        self._segments = open(os.path.join(directory, "segments.bin"), "wb")
+        self._band_energy = open(os.path.join(directory, "band_energy.bin"), "wb")
+        self._paths = open(os.path.join(directory, "paths.bin"), "wb")
+
+    def write_paths(self, store):
+        """Append the paths of a PathStore, numbering them after the ones already written."""
+        segments = store.segments.copy()
+        segments["path"] += self.path_count
+        segments.tofile(self._segments)
+        if len(store):
+            if self.num_bands not in (None, store.num_bands()):
+                raise ValueError(f"Expected {self.num_bands} bands, got {store.num_bands()}.")
+            self.num_bands = store.num_bands()
+            np.ascontiguousarray(store.band_energy, dtype=np.float64).tofile(self._band_energy)
+
+        paths = np.zeros(len(store), dtype=PATH_DTYPE)
+        paths["order"] = store.path_orders()
+        paths["travel_time"] = store.calculate_total_travel_time(self.speed_of_sound)
+        paths["energy_loss"] = store.calculate_energy_loss_of_all()
+        paths.tofile(self._paths)
+
+        self.path_count += len(store)
+        self.segment_count += len(segments)
+
+    def write_image_sources(self, tree):
+        """Store the arrays of an image-source tree."""
+        for field in IMAGE_SOURCE_FIELDS:
+            np.save(os.path.join(self.directory, f"image_sources_{field}.npy"), getattr(tree, field))
+
+    def close(self):
+        self._segments.close()
+        self._band_energy.close()
+        self._paths.close()
+        metadata = {
+            "max_order": self.max_order,
+            "paths": self.path_count,
+            "segments": self.segment_count,
+            "bands": self.num_bands or 1,
+            "speed_of_sound": self.speed_of_sound,
+        }
+        with open(os.path.join(self.directory, "metadata.json"), "w") as file:
+            json.dump(metadata, file, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_results(directory, room):
+    """Write the image sources and paths of a finished simulation to a directory."""
+    with ResultWriter(directory, room.order) as writer:
+        writer.write_image_sources(room.image_sources)
+        writer.write_paths(room.path_store)
+
+
+class ExportedResults:
+    """Memory-mapped view of a directory written by ResultWriter."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "metadata.json")) as file:
+            self.metadata = json.load(file)
+        self.segments = self._memmap("segments.bin", SEGMENT_DTYPE)
+        # Exporte ohne Baender nutzen das Energiefeld der Segmente
+        self.band_energy = None
+        if "bands" in self.metadata:
+            self.band_energy = self._memmap("band_energy.bin", np.float64).reshape(-1, self.metadata["bands"])
+        self.paths = self._memmap("paths.bin", PATH_DTYPE)
+
+    def _memmap(self, name, dtype):
+        path = os.path.join(self.directory, name)
+        if not os.path.getsize(path):
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    @property
+    def path_store(self):
+        """The exported paths as a PathStore over the memory-mapped segments."""
+        return PathStore(self.segments, self.metadata["max_order"], self.band_energy)
+
+    @property
+    def image_sources(self):
+        """The exported image-source tree, or None if none was written."""
+        paths = [
+            os.path.join(self.directory, f"image_sources_{field}.npy")
+            for field in IMAGE_SOURCE_FIELDS
+        ]
+        if not os.path.exists(paths[0]):
+            return None
+        return ImageSourceTree(*(np.load(path, mmap_mode="r") for path in paths))
+
+    def summary(self):
+        """Return a short text summary of the exported paths."""
+        lines = [f"{self.metadata['paths']} paths found."]
+        counts = np.bincount(self.paths["order"], minlength=self.metadata["max_order"] + 1)
+        for order, count in enumerate(counts):
+            lines.append(f"Paths with {order} reflections: {count}")
+        return "\n".join(lines)
@@ -0,0 +1,188 @@
+import numpy as np
+import numpy.linalg as lin
+
+# Minimum distance of a vertex in front of a plane to count as visible
+VISIBILITY_EPSILON = 1e-9
+
+# Segments whose direction has a smaller component along a plane normal are parallel to it
+PARALLEL_EPSILON = 1e-12
+
+
+class PlaneTable:
+    """Oriented planes ``n . x = d`` of faces, shared by triangles and polygons.
+
+    ``inward_normals`` and ``inward_offsets`` describe the same planes
+    oriented towards the inside of the room, so that ``n . x - d`` is
+    positive for points in front of a face.
+    """
+
+    def __init__(self, normals, offsets, orientation):
+        self.normals = np.ascontiguousarray(normals)
+        self.offsets = np.ascontiguousarray(offsets)
+        self.orientation = orientation
+        self.inward_normals = np.ascontiguousarray(orientation * self.normals)
+        self.inward_offsets = np.ascontiguousarray(orientation * self.offsets)
+
+    def __len__(self):
+        return len(self.normals)
+
+    def signed_distances(self, points, face_ids):
+        """Signed distances of points in front of the faces (positive inside)."""
+        return (
+            np.einsum("ij,ij->i", points, self.inward_normals[face_ids])
+            - self.inward_offsets[face_ids]
+        )
+
+    def mirror_sources(self, points, face_ids):
+        """Mirror each point across the plane of the matching face."""
+        points = np.atleast_2d(points)
+        face_ids = np.asarray(face_ids)
+        normals = self.normals[face_ids]
+        distances = np.einsum("ij,ij->i", points, normals) - self.offsets[face_ids]
+        return points - 2 * distances[:, np.newaxis] * normals
+
+    def intersect_planes(self, origins, ends, face_ids):
+        """Intersect segments with the planes of the matching faces.
+
+        Returns the intersection points and the segment parameters ``t``, where
+        ``t`` in (0, 1) means the plane is crossed between origin and end.
+        Segments parallel to their plane get NaN points and parameters.
+        """
+        face_ids = np.asarray(face_ids)
+        normals = self.normals[face_ids]
+        directions = ends - origins
+        denominators = np.einsum("ij,ij->i", directions, normals)
+        # Nur Segmente, die die Ebene schneiden, werden geteilt
+        crossing = np.abs(denominators) > PARALLEL_EPSILON
+        t = np.full(len(denominators), np.nan)
+        t[crossing] = (
+            self.offsets[face_ids[crossing]]
+            - np.einsum("ij,ij->i", origins[crossing], normals[crossing])
+        ) / denominators[crossing]
+        return origins + t[:, np.newaxis] * directions, t
+
+    def triangles_in_front(self, triangles):
+        """(F,T) matrix of the triangles with a vertex in front of each plane."""
+        vertex_distances = (
+            np.einsum("fk,gvk->fgv", self.inward_normals, triangles)
+            - self.inward_offsets[:, None, None]
+        )
+        return (vertex_distances > VISIBILITY_EPSILON).any(axis=2)
+
+
+class FaceGeometry(PlaneTable):
+    """Per-face geometry of a mesh, computed once and stored as contiguous arrays.
+
+    ``normals`` follow the winding of the faces, like ``calculate_normal``.
+    ``face_polygons`` assigns every triangle to its polygon of adjacent
+    coplanar triangles (see ``preprocessing.py``); without it, every
+    triangle is a polygon of its own.
+    """
+
+    def __init__(self, triangles, normals, centroids, offsets, orientation, face_polygons=None):
+        super().__init__(normals, offsets, orientation)
+        self.triangles = np.ascontiguousarray(triangles)
+        self.centroids = np.ascontiguousarray(centroids)
+        if face_polygons is None:
+            face_polygons = np.arange(len(self.triangles))
+        self.face_polygons = np.asarray(face_polygons)
+        self._polygons = None
+
+    @classmethod
+    def from_mesh(cls, mesh, face_polygons=None, orientation=None):
+        """Build the geometry table of a loaded mesh.
+
+        Without an orientation, the normals are taken to point inwards if the
+        volume of the mesh is negative.
+        """
+        triangles = mesh.vertices[mesh.faces]
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        normals /= lin.norm(normals, axis=1)[:, np.newaxis]
+        centroids = triangles.mean(axis=1)
+        offsets = np.einsum("ij,ij->i", normals, centroids)
+        if orientation is None:
+            # Normalen zeigen nach innen, wenn das Volumen negativ ist
+            orientation = -1.0 if mesh.volume > 0 else 1.0
+        return cls(triangles, normals, centroids, offsets, orientation, face_polygons)
+
+    @property
+    def polygons(self):
+        """The PolygonGeometry of the merged coplanar faces, built on first use."""
+        if self._polygons is None:
+            self._polygons = PolygonGeometry(self)
+        return self._polygons
+
+    def visible_from(self):
+        """(F,F) matrix of the faces that lie at least partly in front of each face."""
+        return self.triangles_in_front(self.triangles)
+
+    def contains(self, points, face_ids, tolerance=1e-9):
+        """Check whether points on a face plane lie inside the triangle."""
+        v0, v1, v2 = np.moveaxis(self.triangles[face_ids], 1, 0)
+        e0, e1, p = v1 - v0, v2 - v0, points - v0
+        d00 = np.einsum("ij,ij->i", e0, e0)
+        d01 = np.einsum("ij,ij->i", e0, e1)
+        d11 = np.einsum("ij,ij->i", e1, e1)
+        d20 = np.einsum("ij,ij->i", p, e0)
+        d21 = np.einsum("ij,ij->i", p, e1)
+        denominators = d00 * d11 - d01 * d01
+        v = (d11 * d20 - d01 * d21) / denominators
+        w = (d00 * d21 - d01 * d20) / denominators
+        return (v >= -tolerance) & (w >= -tolerance) & (v + w <= 1 + tolerance)
+
+    def locate(self, points, face_ids):
+        """Return the face of every point on a face plane, or -1 outside the face."""
+        return np.where(self.contains(points, face_ids), face_ids, -1)
+
+
+class PolygonGeometry(PlaneTable):
+    """Planar polygons of adjacent coplanar triangles of a FaceGeometry.
+
+    Each polygon uses the plane of its largest triangle. Image sources are
+    mirrored across polygons instead of triangles, so a rectangular wall
+    made of two triangles produces one branch of the image-source tree
+    instead of two. ``locate`` maps points back to the triangle they lie
+    in, which is what paths and materials refer to.
+    """
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        face_polygons = geometry.face_polygons
+        num_polygons = face_polygons.max() + 1 if len(face_polygons) else 0
+        v0, v1, v2 = np.moveaxis(geometry.triangles, 1, 0)
+        areas = lin.norm(np.cross(v1 - v0, v2 - v0), axis=1)
+
+        # Dreiecke nach Polygon und absteigender Flaeche sortiert
+        order = np.lexsort((-areas, face_polygons))
+        counts = np.bincount(face_polygons, minlength=num_polygons)
+        starts = np.cumsum(counts) - counts
+        self.representatives = order[starts]
+        self.members = np.full((num_polygons, counts.max(initial=0)), -1)
+        self.members[face_polygons[order], np.arange(len(order)) - np.repeat(starts, counts)] = order
+        super().__init__(
+            geometry.normals[self.representatives],
+            geometry.offsets[self.representatives],
+            geometry.orientation,
+        )
+
+    def visible_from(self):
+        """(P,P) matrix of the polygons that lie at least partly in front of each polygon."""
+        in_front = self.triangles_in_front(self.geometry.triangles).astype(np.int64)
+        membership = np.zeros((len(self.geometry), len(self)), dtype=np.int64)
+        membership[np.arange(len(self.geometry)), self.geometry.face_polygons] = 1
+        return in_front @ membership > 0
+
+    def locate(self, points, polygon_ids):
+        """Return the triangle of its polygon that contains every point, or -1 outside."""
+        face_ids = np.full(len(points), -1)
+        for column in self.members.T:
+            candidates = column[polygon_ids]
+            open_rows = np.flatnonzero((face_ids < 0) & (candidates >= 0))
+            if not open_rows.size:
+                continue
+            inside = self.geometry.contains(points[open_rows], candidates[open_rows])
+            face_ids[open_rows[inside]] = candidates[open_rows[inside]]
+        return face_ids
+
+    def __repr__(self):
+        return f"PolygonGeometry with {len(self)} polygons of {len(self.geometry)} triangles."
@@ -0,0 +1,106 @@
+import numpy as np
+
+# Minimum distance a parent image must have in front of a face to be mirrored
+VALIDITY_EPSILON = 1e-9
+
+
+class ImageSourceTree:
+    """Image sources of one source up to a reflection order, stored as flat arrays.
+
+    Index 0 is the real source (order 0, no face, no parent). Every other
+    entry is the mirror image of its parent across the face with index
+    ``faces[i]``. Built on ``FaceGeometry.polygons``, the faces are the
+    polygons of merged coplanar triangles; any FaceGeometry works as well.
+    """
+
+    def __init__(self, positions, parents, faces, orders):
+        self.positions = positions
+        self.parents = parents
+        self.faces = faces
+        self.orders = orders
+
+    @classmethod
+    def build(cls, geometry, source, order):
+        """Generate all valid image sources of a mesh up to the given order."""
+        root = cls(
+            np.asarray(source, dtype=float)[np.newaxis],
+            np.array([-1]),
+            np.array([-1]),
+            np.array([0]),
+        )
+        return root.extend(geometry, order)
+
+    def extend(self, geometry, order):
+        """Return a tree with the image sources of the orders above this tree's up to order.
+
+        Each order is produced in one batched step from the previous one. A
+        candidate is skipped when it reflects across the face its parent was
+        just reflected from, when the parent lies behind the face (validity),
+        or when the face lies completely behind the parent's face (visibility).
+        The existing entries keep their indices.
+        """
+        num_faces = len(geometry)
+        face_visible_from = geometry.visible_from()
+
+        positions = [self.positions]
+        parents = [self.parents]
+        faces = [self.faces]
+        orders = [self.orders]
+
+        start_order = self.orders.max()
+        frontier = self.of_order(start_order)
+        frontier_positions = self.positions[frontier]
+        frontier_faces = self.faces[frontier]
+        count = len(self)
+        for current_order in range(start_order + 1, order + 1):
+            if not frontier.size:
+                break
+            parent_idx = np.repeat(np.arange(len(frontier)), num_faces)
+            face_idx = np.tile(np.arange(num_faces), len(frontier))
+            parent_faces = frontier_faces[parent_idx]
+
+            distances = geometry.signed_distances(frontier_positions[parent_idx], face_idx)
+            keep = (face_idx != parent_faces) & (distances > VALIDITY_EPSILON)
+            has_parent_face = parent_faces >= 0
+            keep[has_parent_face] &= face_visible_from[
+                parent_faces[has_parent_face], face_idx[has_parent_face]
+            ]
+
+            parent_idx, face_idx = parent_idx[keep], face_idx[keep]
+            new_positions = geometry.mirror_sources(frontier_positions[parent_idx], face_idx)
+            new_parents = frontier[parent_idx]
+
+            positions.append(new_positions)
+            parents.append(new_parents)
+            faces.append(face_idx)
+            orders.append(np.full(len(face_idx), current_order))
+
+            frontier = np.arange(count, count + len(face_idx))
+            frontier_positions = new_positions
+            frontier_faces = face_idx
+            count += len(face_idx)
+
+        return ImageSourceTree(
+            np.concatenate(positions),
+            np.concatenate(parents),
+            np.concatenate(faces),
+            np.concatenate(orders),
+        )
+
+    def __len__(self):
+        return len(self.positions)
+
+    def of_order(self, order):
+        """Return the indices of all image sources of the given order."""
+        return np.flatnonzero(self.orders == order)
+
+    def face_sequence(self, index):
+        """Return the faces an image source was reflected across, from the source on."""
+        sequence = []
+        while self.parents[index] >= 0:
+            sequence.append(self.faces[index])
+            index = self.parents[index]
+        return sequence[::-1]
+
+    def __repr__(self):
+        return f"ImageSourceTree with {len(self)} image sources up to order {self.orders.max()}."
@@ -0,0 +1,98 @@
+import numpy as np
+
+
+class ImpulseResponse:
+    """A sampled room impulse response built from the paths of a simulation.
+
+    A broadband response has one row of samples; a per-band response has
+    shape (B, L) and the center frequencies of its bands in ``bands``.
+    """
+
+    def __init__(self, samples, sample_rate, bands=None):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.bands = None if bands is None else tuple(bands)
+
+    @classmethod
+    def from_paths(
+        cls,
+        path_store,
+        sample_rate=44100,
+        speed_of_sound=343.0,
+        duration=None,
+        bands=None,
+    ):
+        """Bin the arrivals of all paths into an impulse response.
+
+        Each path contributes the energy of its last segment, which already
+        carries the reflection coefficient of every reflection, scaled by
+        1/r^2 over its whole length, at the sample of its arrival time.
+        Arrivals in the same sample add up. With bands, every band energy of
+        the store is binned into its own row.
+        """
+        distances = path_store.total_distances()
+        energies = path_store.arrival_band_energies()
+        if bands is None:
+            energies = energies.mean(axis=1, keepdims=True)
+
+        bins = np.rint(distances / speed_of_sound * sample_rate).astype(np.int64)
+        length = int(np.ceil(duration * sample_rate)) if duration else bins.max(initial=-1) + 1
+        inside = bins < length
+        samples = np.stack(
+            [
+                np.bincount(bins[inside], weights=band[inside], minlength=length)
+                for band in energies.T
+            ]
+        )
+        if bands is None:
+            return cls(samples[0], sample_rate)
+        return cls(samples, sample_rate, bands)
+
+    def __len__(self):
+        return self.samples.shape[-1]
+
+    def band(self, frequency):
+        """Return the broadband response of one band, selected by its center frequency."""
+        return ImpulseResponse(self.samples[self.bands.index(frequency)], self.sample_rate)
+
+    def times(self):
+        """Return the time of every sample in seconds."""
+        return np.arange(len(self)) / self.sample_rate
+
+    def save(self, file_path):
+        """Save the impulse response as an .npz file."""
+        bands = () if self.bands is None else self.bands
+        np.savez(file_path, samples=self.samples, sample_rate=self.sample_rate, bands=bands)
+
+    @classmethod
+    def load(cls, file_path):
+        """Load an impulse response saved with save."""
+        with np.load(file_path) as data:
+            bands = data["bands"].tolist() if "bands" in data and data["bands"].size else None
+            return cls(data["samples"], int(data["sample_rate"]), bands)
+
+    def plot(self, ax=None):
+        """Plot the impulse response (requires matplotlib)."""
+        import matplotlib.pyplot as plt
+
+        if ax is None:
+            ax = plt.figure().add_subplot(111)
+        if self.bands is not None:
+            for frequency in self.bands:
+                response = self.band(frequency)
+                nonzero = np.flatnonzero(response.samples)
+                ax.plot(response.times()[nonzero], response.samples[nonzero], ".", label=f"{frequency} Hz")
+            ax.legend()
+        else:
+            nonzero = np.flatnonzero(self.samples)
+            ax.stem(self.times()[nonzero], self.samples[nonzero], basefmt="k-")
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Energy")
+        ax.set_title("Room Impulse Response")
+        ax.grid(True)
+        return ax
+
+    def __repr__(self):
+        if self.bands is not None:
+            return f"ImpulseResponse with {len(self.bands)} bands of {len(self)} samples at {self.sample_rate} Hz."
+        return f"ImpulseResponse with {len(self)} samples at {self.sample_rate} Hz."
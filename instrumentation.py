@@ -0,0 +1,136 @@
+import cProfile
+import io
+import pstats
+import time
+from contextlib import contextmanager, nullcontext
+
+# "cprofile" uses the standard library, "sampling" needs pyinstrument
+PROFILERS = ("cprofile", "sampling")
+
+
+class RunSummary:
+    """Timings, counters and an optional profile of one simulation run."""
+
+    def __init__(self, timings, counters, profile=None):
+        self.timings = timings
+        self.counters = counters
+        self.profile = profile
+
+    def __repr__(self):
+        lines = ["Run summary:"]
+        for name, seconds in self.timings.items():
+            lines.append(f"  {name:<24}{seconds:>12.6f} s")
+        for name, value in self.counters.items():
+            lines.append(f"  {name:<24}{value:>12}")
+        return "\n".join(lines)
+
+
+class Instrumentation:
+    """Per-phase timers and counters of a simulation, with optional profiling.
+
+    Phases may be nested; each one accumulates its own wall-clock time over
+    all of its calls.
+    """
+
+    enabled = True
+
+    def __init__(self, profiler=None):
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler!r}, expected one of {PROFILERS}.")
+        if profiler == "sampling":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError as error:
+                raise ImportError(
+                    "The sampling profiler needs pyinstrument; install it with "
+                    "'pip install pyinstrument' or use the cprofile profiler."
+                ) from error
+        self.profiler = profiler
+        self.timings = {}
+        self.counters = {}
+        self._profile = None
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block and add it to the phase's total."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, n=1):
+        """Add n to a counter."""
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def reset(self):
+        """Clear all timings and counters."""
+        self.timings = {}
+        self.counters = {}
+
+    def merge(self, summary):
+        """Add the timings and counters of a RunSummary, e.g. of a worker process."""
+        for name, seconds in summary.timings.items():
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+        for name, value in summary.counters.items():
+            self.count(name, value)
+
+    def start_profile(self):
+        """Start the configured profiler, if any."""
+        if self.profiler == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.profiler == "sampling":
+            from pyinstrument import Profiler
+
+            self._profile = Profiler()
+            self._profile.start()
+
+    def stop_profile(self, limit=25):
+        """Stop the profiler and return its report as text."""
+        if self._profile is None:
+            return None
+        if self.profiler == "cprofile":
+            self._profile.disable()
+            stream = io.StringIO()
+            pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(limit)
+            report = stream.getvalue()
+        else:
+            self._profile.stop()
+            report = self._profile.output_text()
+        self._profile = None
+        return report
+
+    def summary(self, profile=None):
+        return RunSummary(dict(self.timings), dict(self.counters), profile)
+
+
+class NullInstrumentation:
+    """Stand-in used when instrumentation is disabled; every call is a no-op."""
+
+    enabled = False
+    _null_context = nullcontext()
+
+    def phase(self, name):
+        return self._null_context
+
+    def count(self, name, n=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def merge(self, summary):
+        pass
+
+    def start_profile(self):
+        pass
+
+    def stop_profile(self, limit=25):
+        return None
+
+    def summary(self, profile=None):
+        return None
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
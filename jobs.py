@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from cache import GeometryCache, file_hash
+from mirror_image_method import MirrorImageMethod
+from utils import Target
+
+
+class SimulationSpec:
+    """Parameters of one room simulation, as submitted to the JobService."""
+
+    def __init__(
+        self,
+        file_path,
+        source,
+        target,
+        order,
+        initial_rays,
+        target_radius=0.5,
+        reflection_coefficient=1.0,
+        mode="stochastic",
+        seed=None,
+        materials=None,
+    ):
+        self.file_path = file_path
+        self.source = np.asarray(source, dtype=float)
+        self.target = np.asarray(target, dtype=float)
+        self.order = order
+        self.initial_rays = initial_rays
+        self.target_radius = target_radius
+        self.reflection_coefficient = reflection_coefficient
+        self.mode = mode
+        self.seed = seed
+        self.materials = materials
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(**spec)
+
+    def key(self):
+        """Hash of the mesh and material contents and of all parameters.
+
+        Specs with the same key give the same result; unseeded stochastic
+        runs count as the same run as well.
+        """
+        parameters = {
+            "mesh": file_hash(self.file_path),
+            "materials": file_hash(self.materials) if self.materials else None,
+            "source": self.source.tolist(),
+            "target": self.target.tolist(),
+            "target_radius": self.target_radius,
+            "order": self.order,
+            "initial_rays": self.initial_rays,
+            "reflection_coefficient": self.reflection_coefficient,
+            "mode": self.mode,
+            "seed": self.seed,
+        }
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()[:32]
+
+    def __repr__(self):
+        return (
+            f"SimulationSpec({self.file_path}, source={self.source.tolist()}, "
+            f"target={self.target.tolist()}, order={self.order}, rays={self.initial_rays})"
+        )
+
+
+class JobResult:
+    """The paths of a finished job together with its timings in seconds.
+
+    ``wait`` is the time from submission to the start on a worker, ``run``
+    the time spent in the worker, and ``phases`` the instrumented phase
+    timings of the simulation. Jobs answered from a cache have ``cached``
+    set and no phases.
+    """
+
+    def __init__(self, spec, path_store, wait, run, phases=None, cached=False):
+        self.spec = spec
+        self.path_store = path_store
+        self.wait = wait
+        self.run = run
+        self.phases = phases or {}
+        self.cached = cached
+
+    def __repr__(self):
+        source = "cache" if self.cached else f"{self.run:.3f} s"
+        return f"JobResult with {len(self.path_store)} paths ({source}, waited {self.wait:.3f} s)."
+
+
+def run_spec(spec, cache_directory=None):
+    """Run one simulation; executed in a worker process."""
+    start = time.perf_counter()
+    cache = GeometryCache(cache_directory) if cache_directory else None
+    phases = {}
+
+    def compute():
+        room = MirrorImageMethod(
+            spec.file_path,
+            spec.source,
+            Target(spec.target, spec.target_radius),
+            spec.order,
+            spec.reflection_coefficient,
+            spec.initial_rays,
+            mode=spec.mode,
+            seed=spec.seed,
+            materials=spec.materials,
+            cache=cache,
+            instrument=True,
+        )
+        phases.update(room.run_summary.timings)
+        return room.path_store
+
+    if cache is None:
+        store = compute()
+    else:
+        store = cache.load_paths(spec.file_path, spec.key(), compute)
+    return store, time.perf_counter() - start, phases
+
+
+class JobService:
+    """Runs simulation specs on a bounded pool of worker processes.
+
+    Jobs go through an asyncio queue to ``workers`` consumers, each of which
+    runs one job at a time in the process pool, so at most ``workers`` jobs
+    run at once. Identical specs (same ``key``) share one job while it runs
+    and are answered from memory afterwards; with a cache directory,
+    results also survive in the GeometryCache across runs.
+    """
+
+    def __init__(self, workers=None, cache_directory=None, progress=None):
+        self.workers = workers or os.cpu_count()
+        self.cache_directory = cache_directory
+        self.progress = progress
+        self.results = {}
+        self.submitted = 0
+        self.finished = 0
+        self._queue = None
+        self._consumers = []
+        self._executor = None
+
+    async def __aenter__(self):
+        self._queue = asyncio.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._executor.shutdown()
+
+    def submit(self, spec):
+        """Queue a spec and return a future of its JobResult."""
+        loop = asyncio.get_running_loop()
+        self.submitted += 1
+        key = spec.key()
+        shared = self.results.get(key)
+        future = loop.create_future()
+        if shared is None:
+            shared = loop.create_future()
+            self.results[key] = shared
+            self._queue.put_nowait((spec, shared, time.perf_counter()))
+            shared.add_done_callback(lambda done: self._resolve(done, future, spec, False))
+        else:
+            # Gleicher Job: auf das Ergebnis des ersten warten
+            shared.add_done_callback(lambda done: self._resolve(done, future, spec, True))
+        return future
+
+    def _resolve(self, shared, future, spec, duplicate):
+        if shared.cancelled():
+            future.cancel()
+            return
+        if shared.exception() is not None:
+            future.set_exception(shared.exception())
+            return
+        result = shared.result()
+        if duplicate:
+            result = JobResult(spec, result.path_store, 0.0, 0.0, cached=True)
+        future.set_result(result)
+        self.finished += 1
+        if self.progress is not None:
+            self.progress(self.finished, self.submitted, result)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            spec, shared, submitted = await self._queue.get()
+            wait = time.perf_counter() - submitted
+            try:
+                store, run, phases = await loop.run_in_executor(
+                    self._executor, run_spec, spec, self.cache_directory
+                )
+                shared.set_result(JobResult(spec, store, wait, run, phases, cached=not phases))
+            except Exception as error:
+                shared.set_exception(error)
+            finally:
+                self._queue.task_done()
+
+    async def run(self, specs):
+        """Run all specs and return their JobResults in the same order."""
+        return await asyncio.gather(*(self.submit(spec) for spec in specs))
+
+
+def run_jobs(specs, workers=None, cache_directory=None, progress=None):
+    """Run specs on a JobService from synchronous code."""
+
+    async def main():
+        async with JobService(workers, cache_directory, progress) as service:
+            return await service.run(specs)
+
+    return asyncio.run(main())
+
+
+def print_progress(finished, total, result):
+    if result.cached:
+        timing = "cached"
+    else:
+        timing = f"run {result.run:8.3f} s  wait {result.wait:8.3f} s"
+    print(f"[{finished:>4}/{total}] {len(result.path_store):>6} paths  {timing}  {result.spec}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a batch of room simulations on a worker pool.")
+    parser.add_argument("specs", help="JSON file with a list of simulation specs")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: all cores)")
+    parser.add_argument("--cache", help="directory of the result cache")
+    args = parser.parse_args(argv)
+
+    with open(args.specs) as file:
+        specs = [SimulationSpec.from_dict(spec) for spec in json.load(file)]
+
+    start = time.perf_counter()
+    results = run_jobs(specs, args.workers, args.cache, print_progress)
+    elapsed = time.perf_counter() - start
+    computed = [result for result in results if not result.cached]
+    print(
+        f"{len(results)} jobs in {elapsed:.3f} s, {len(computed)} computed, "
+        f"{len(results) - len(computed)} from cache, "
+        f"{sum(result.run for result in computed):.3f} s of worker time."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,55 @@
+import argparse
 import numpy as np
-from mirror_image_method import MirrorImageMethod
-from visualization import MeshVisualizer
+from mirror_image_method import MirrorImageMethod, PATH_MODES
 from utils import Target
-import matplotlib.pyplot as plt
+from instrumentation import PROFILERS
+from sampling import SAMPLERS
+from export import export_results
 
 
-def main():
+def parse_args(argv=None):
+    """Parse the command line arguments of the simulation."""
+    parser = argparse.ArgumentParser(description="Simulate sound reflections with the mirror image method.")
+    parser.add_argument("--mesh", default="./model/cube5.obj", help="path to the mesh file")
+    parser.add_argument("--source", type=float, nargs=3, default=[0.123, 0.2, 0.113], help="source point")
+    parser.add_argument("--target", type=float, nargs=3, help="target position (random if omitted)")
+    parser.add_argument("--radius", type=float, default=0.5, help="target radius")
+    parser.add_argument("--order", type=int, default=2, help="reflection order")
+    parser.add_argument("--reflection-coefficient", type=float, default=1.0)
+    parser.add_argument("--materials", help="material sidecar file with per-face band absorption")
+    parser.add_argument("--rays", type=int, default=10000, help="number of initial rays")
+    parser.add_argument("--mode", choices=PATH_MODES, default="stochastic")
+    parser.add_argument("--sampler", choices=SAMPLERS, default="random", help="how the initial ray directions are distributed")
+    parser.add_argument("--no-analytic-box", action="store_true", help="use the general mesh solver for box rooms too")
+    parser.add_argument("--seed", type=int, help="seed for reproducible rays")
+    parser.add_argument("--hits-per-order", type=int, help="trace adaptively until every order has this many paths")
+    parser.add_argument("--relative-error", type=float, help="trace adaptively until the hit probabilities are this precise")
+    parser.add_argument("--max-rays", type=int, help="upper limit of traced rays (default: 100 times --rays)")
+    parser.add_argument("--energy-threshold", type=float, help="terminate rays whose energy falls below this level")
+    parser.add_argument("--russian-roulette", action="store_true", help="terminate weak rays by Russian roulette")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes (not with --hits-per-order or --relative-error)")
+    parser.add_argument("--instrument", action="store_true", help="print per-phase timings and counters")
+    parser.add_argument("--profile", choices=PROFILERS, help="profile the run and print the report")
+    parser.add_argument("--no-plot", action="store_true", help="run headless and print a summary")
+    parser.add_argument("--export", help="write image sources and paths to this directory")
+    parser.add_argument("--verbose", action="store_true", help="print every path and ray while plotting")
+    parser.add_argument("--output", help="render the plots off-screen into this image file")
+    parser.add_argument("--rir", help="save the room impulse response to this .npz file")
+    parser.add_argument("--sample-rate", type=int, default=44100, help="sample rate of the impulse response")
+    parser.add_argument("--per-band", action="store_true", help="save one impulse response per frequency band")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
     # Path to the mesh file
-    mesh_file_path = "./model/cube5.obj"
+    mesh_file_path = args.mesh
 
     # Source point of the sound
-    source_point = np.array([0.123, 0.2, 0.113])
+    source_point = np.array(args.source)
 
-    # Target point of the sound 
+    # Target point of the sound
     target_face = 5
 
     #Auskommentieren wenn Rechteck als Mesh verwendet wird
@@ -20,17 +57,24 @@ def main():
     target_radius = 0.1 """
 
     # Generate a target Object with random coordinates and radius that will be hit by the sound
-    target_position = Target.generate_random_coordinates()
-    target_radius = 0.5
+    if args.target is None:
+        target_position = Target.generate_random_coordinates()
+    else:
+        target_position = np.array(args.target)
+    target_radius = args.radius
 
     target = Target(target_position, target_radius)
 
     # Reflection order and reflection coefficient
-    reflections_order = 2
-    reflection_coefficient = 1.0
-    
+    reflections_order = args.order
+    reflection_coefficient = args.reflection_coefficient
+
     # Number of initial rays to be generated from the source point
-    initial_rays = 10000
+    initial_rays = args.rays
+
+    # "stochastic" shoots random rays, "deterministic" finds every specular
+    # path up to the reflection order from the image sources
+    mode = args.mode
 
     room = MirrorImageMethod(
         mesh_file_path,
@@ -38,12 +82,47 @@ def main():
         target,
         reflections_order,
         reflection_coefficient=reflection_coefficient,
-        initial_rays = initial_rays
+        materials = args.materials,
+        initial_rays = initial_rays,
+        mode = mode,
+        sampler = args.sampler,
+        analytic_box = not args.no_analytic_box,
+        workers = args.workers,
+        seed = args.seed,
+        hits_per_order = args.hits_per_order,
+        relative_error = args.relative_error,
+        max_rays = args.max_rays,
+        energy_threshold = args.energy_threshold,
+        russian_roulette = args.russian_roulette,
+        instrument = args.instrument,
+        profiler = args.profile,
     )
-    visualizer = MeshVisualizer(room)
+
+    if room.run_summary is not None:
+        print(room.run_summary)
+        if room.run_summary.profile:
+            print(room.run_summary.profile)
+
+    if args.export:
+        export_results(args.export, room)
+
+    if args.rir:
+        room.impulse_response(sample_rate=args.sample_rate, per_band=args.per_band).save(args.rir)
+
+    if args.no_plot:
+        store = room.path_store
+        print(f"{len(store)} paths found.")
+        for order, path_ids in store.group_by_order().items():
+            print(f"Paths with {order} reflections: {len(path_ids)}")
+        return
+
+    # Erst hier importieren, damit der Headless-Modus kein Display braucht
+    from visualization import MeshVisualizer
+
+    visualizer = MeshVisualizer(room, verbose=args.verbose)
 
     # Plot the mesh
-    visualizer.plot_mesh()
+    visualizer.plot_mesh(args.output)
 
 
 if __name__ == "__main__":
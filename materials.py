@@ -0,0 +1,123 @@
+import json
+import numpy as np
+
+# Center frequencies of the octave bands in Hz
+OCTAVE_BANDS = (125, 250, 500, 1000, 2000, 4000)
+
+
+class MaterialTable:
+    """Absorption coefficient of every face in every frequency band.
+
+    ``absorption`` is an (F,B) array. A reflection off face f keeps
+    ``reflection[f] = 1 - absorption[f]`` of the energy in every band, the
+    per-band counterpart of the scalar reflection coefficient.
+    """
+
+    def __init__(self, absorption, bands=OCTAVE_BANDS, face_materials=None):
+        self.absorption = np.atleast_2d(np.asarray(absorption, dtype=float))
+        self.bands = tuple(bands)
+        if self.absorption.shape[1] != len(self.bands):
+            raise ValueError(
+                f"Expected {len(self.bands)} absorption coefficients per face, "
+                f"got {self.absorption.shape[1]}."
+            )
+        self.reflection = 1.0 - self.absorption
+        self.face_materials = face_materials
+
+    @classmethod
+    def uniform(cls, num_faces, reflection_coefficient, bands=OCTAVE_BANDS):
+        """Give every face and band the same reflection coefficient."""
+        return cls(np.full((num_faces, len(bands)), 1.0 - reflection_coefficient), bands)
+
+    @classmethod
+    def from_file(cls, file_path, mesh_file_path, geometry):
+        """Load a material sidecar file for a mesh.
+
+        The JSON file lists the octave bands, the absorption coefficients of
+        every material, and which faces use which material::
+
+            {
+                "bands": [125, 250, 500, 1000, 2000, 4000],
+                "materials": {"concrete": [0.01, ...], "carpet": [0.02, ...]},
+                "default": "concrete",
+                "groups": {"Floor": "carpet"},
+                "faces": {"carpet": [0, 1]}
+            }
+
+        ``groups`` maps the ``usemtl`` groups of the OBJ file to materials,
+        ``faces`` assigns materials to triangle indices directly and wins
+        over the groups. Faces without an entry get the ``default`` material.
+        """
+        with open(file_path) as file:
+            spec = json.load(file)
+        bands = spec.get("bands", OCTAVE_BANDS)
+        names = list(spec["materials"])
+        coefficients = np.array([spec["materials"][name] for name in names], dtype=float)
+
+        material_ids = np.full(len(geometry), -1)
+        if "default" in spec:
+            material_ids[:] = names.index(spec["default"])
+        groups = spec.get("groups", {})
+        if groups:
+            face_groups = obj_face_groups(mesh_file_path, geometry)
+            for group, material in groups.items():
+                material_ids[face_groups == group] = names.index(material)
+        for material, faces in spec.get("faces", {}).items():
+            material_ids[np.asarray(faces, dtype=np.int64)] = names.index(material)
+
+        if (material_ids < 0).any():
+            missing = np.flatnonzero(material_ids < 0)
+            raise ValueError(f"Faces without material and no default: {missing.tolist()}")
+        face_materials = np.array(names, dtype=object)[material_ids]
+        return cls(coefficients[material_ids], bands, face_materials)
+
+    def __len__(self):
+        return len(self.absorption)
+
+    @property
+    def num_bands(self):
+        return len(self.bands)
+
+    def __repr__(self):
+        return f"MaterialTable with {len(self)} faces and {self.num_bands} bands."
+
+
+def obj_face_groups(mesh_file_path, geometry):
+    """Return the ``usemtl`` group of every face of the geometry.
+
+    The polygons of the OBJ file are read again, and every triangle of the
+    loaded mesh is assigned to the polygon that contains all three of its
+    corners. The mapping therefore does not depend on how trimesh orders or
+    triangulates the faces.
+    """
+    vertices = []
+    polygons_of_vertex = {}
+    groups = []
+    group = None
+    with open(mesh_file_path) as file:
+        for line in file:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "v":
+                vertices.append(_vertex_key(np.array(parts[1:4], dtype=float)))
+            elif parts[0] == "usemtl":
+                group = parts[1] if len(parts) > 1 else None
+            elif parts[0] == "f":
+                ids = [int(part.split("/")[0]) for part in parts[1:]]
+                for i in ids:
+                    key = vertices[i - 1 if i > 0 else len(vertices) + i]
+                    polygons_of_vertex.setdefault(key, set()).add(len(groups))
+                groups.append(group)
+
+    face_groups = np.full(len(geometry), None, dtype=object)
+    for face_id, triangle in enumerate(geometry.triangles):
+        candidates = [polygons_of_vertex.get(_vertex_key(corner), set()) for corner in triangle]
+        polygons = set.intersection(*candidates)
+        if polygons:
+            face_groups[face_id] = groups[min(polygons)]
+    return face_groups
+
+
+def _vertex_key(point, decimals=6):
+    return tuple(np.round(point, decimals) + 0.0)
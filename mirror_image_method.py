@@ -1,7 +1,39 @@
+import warnings
 import trimesh
 import numpy as np
 import numpy.linalg as lin
-from utils import Ray, Target, SoundPath
+from utils import Target
+from path_store import PathStore
+from image_sources import ImageSourceTree
+from preprocessing import load_room
+from acceleration import BVH
+from box_room import BoxRoom
+from parallel import ParallelTracer, DEFAULT_CHUNK_SIZE
+from impulse_response import ImpulseResponse
+from materials import MaterialTable
+from sampling import DirectionSampler, check_sampler, sample_directions
+from adaptive import AdaptiveSampler
+from ray_front import RayFront
+from receivers import Receivers
+from instrumentation import Instrumentation, NULL_INSTRUMENTATION
+
+# "stochastic" shoots random rays, "deterministic" back-traces the image sources
+PATH_MODES = ("stochastic", "deterministic")
+
+# "bvh" uses the pure NumPy BVH, "trimesh" the mesh.ray intersector, "box"
+# the closed-form wall hits of an axis-aligned box room
+RAY_BACKENDS = ("bvh", "trimesh", "box")
+
+# Distance a reflected ray is moved off the wall before it is shot again
+SELF_HIT_EPSILON = 1e-5
+
+# Slack for a segment end point that lies exactly on a wall
+OCCLUSION_TOLERANCE = 1e-5
+
+
+def concatenate_columns(batches):
+    """Concatenate a list of dicts of arrays key by key."""
+    return {key: np.concatenate([batch[key] for batch in batches]) for key in batches[0]}
 
 
 class MirrorImageMethod:
@@ -13,50 +45,143 @@ class MirrorImageMethod:
         order: int,
         reflection_coefficient: float,
         initial_rays: int,
+        mode: str = "stochastic",
+        sampler: str = "random",
+        ray_backend: str = "auto",
+        analytic_box: bool = True,
+        workers: int = 1,
+        chunk_size: int = None,
+        seed: int = None,
+        hits_per_order: int = None,
+        relative_error: float = None,
+        max_rays: int = None,
+        compute_paths: bool = True,
+        keep_rays: bool = False,
+        cache=None,
+        materials=None,
+        energy_threshold: float = None,
+        russian_roulette: bool = False,
+        instrument: bool = False,
+        profiler: str = None,
     ):
-        self.mesh = trimesh.load_mesh(file_path)
+        self.file_path = file_path
+        self.cache = cache
+        if instrument or profiler is not None:
+            self.instrumentation = Instrumentation(profiler)
+        else:
+            self.instrumentation = NULL_INSTRUMENTATION
+        self.instrumentation.start_profile()
+        with self.instrumentation.phase("mesh_load"):
+            if cache is not None:
+                self.mesh, self.geometry, self.mesh_report = cache.load_mesh(file_path)
+            else:
+                self.mesh, self.geometry, self.mesh_report = load_room(file_path)
+            self.box = BoxRoom.from_geometry(self.geometry) if analytic_box else None
+            if ray_backend == "auto" and self.box is not None:
+                ray_backend = "box"
+            elif ray_backend == "auto":
+                # Ohne embree ist die eigene BVH schneller als trimesh
+                ray_backend = "trimesh" if trimesh.ray.has_embree else "bvh"
+            if ray_backend not in RAY_BACKENDS:
+                raise ValueError(
+                    f"Unknown ray backend {ray_backend!r}, expected one of {RAY_BACKENDS}."
+                )
+            if ray_backend == "box" and self.box is None:
+                raise ValueError("The box ray backend needs an axis-aligned box mesh.")
+            self.ray_backend = ray_backend
+            self.bvh = BVH(self.geometry.triangles) if ray_backend == "bvh" else None
         self.source = source
         self.order = order
         self.target = target
         self.reflection_coefficient = reflection_coefficient
-        self.image_sources = self.find_image_sources(source, order, current_order=order)
+        # Ohne Materialtabelle gilt der Reflexionskoeffizient fuer alle Flaechen und Baender
+        if materials is None:
+            materials = MaterialTable.uniform(len(self.geometry), reflection_coefficient)
+        elif isinstance(materials, str):
+            materials = MaterialTable.from_file(materials, file_path, self.geometry)
+        self.materials = materials
+        self._image_sources = None
         self.initial_rays = initial_rays
-        self.paths = self.calculate_paths()
-        
-
-    def calculate_normal(self, face):
-        """Calculate the normal of a face."""
-        v0, v1, v2 = self.mesh.vertices[face]
-        e0 = v1 - v0
-        e1 = v2 - v0
-        normal = np.cross(e0, e1)
-        return normal / lin.norm(normal)
-
-    def centroid_of_face(self, face):
-        """Calculate the centroid of a face."""
-        v0, v1, v2 = self.mesh.vertices[face]
-        return np.mean([v0, v1, v2], axis=0)
-
-    def mirror_source(self, source, face):
+        if mode not in PATH_MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {PATH_MODES}.")
+        self.mode = mode
+        check_sampler(sampler)
+        self.sampler = sampler
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.hits_per_order = hits_per_order
+        self.relative_error = relative_error
+        self.max_rays = max_rays
+        self.energy_threshold = energy_threshold
+        self.russian_roulette = russian_roulette
+        self.keep_rays = keep_rays
+        single_process = hits_per_order is not None or relative_error is not None or keep_rays
+        if workers > 1 and mode == "stochastic" and single_process:
+            warnings.warn(
+                f"workers={workers} is ignored: runs with hits_per_order, relative_error "
+                "or keep_rays trace in a single process.",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+        self.path_store = None
+        self.adaptive_sampler = None
+        self.ray_front = None
+        if compute_paths:
+            with self.instrumentation.phase("paths"):
+                self.path_store = self.calculate_paths()
+            self.instrumentation.count("paths_found", len(self.path_store))
+        self._paths = None
+        self.run_summary = self.instrumentation.summary(self.instrumentation.stop_profile())
+
+    @property
+    def paths(self):
+        """The paths grouped by order as lists of SoundPath objects, built on first use."""
+        if self._paths is None and self.path_store is not None:
+            self._paths = self.path_store.to_paths_dict()
+        return self._paths
+
+    @property
+    def image_sources(self):
+        """The image-source tree of the source, built on first use."""
+        if self._image_sources is None:
+            self._image_sources = self.find_image_sources(self.source, self.order)
+        return self._image_sources
+
+    @image_sources.setter
+    def image_sources(self, tree):
+        self._image_sources = tree
+
+    def calculate_normal(self, face_index):
+        """Return the unit normal of a face."""
+        return self.geometry.normals[face_index]
+
+    def centroid_of_face(self, face_index):
+        """Return the centroid of a face."""
+        return self.geometry.centroids[face_index]
+
+    def mirror_source(self, source, face_index):
         """Calculate the mirrored source of a face."""
-        centroid = self.centroid_of_face(face)
-        r = centroid - source
-        normal = self.calculate_normal(face)
-        orthogonal = np.dot(r, normal) * normal
-        return 2 * orthogonal + source
+        return self.geometry.mirror_sources(source, [face_index])[0]
+
+    def mirror_sources(self, points, face_ids):
+        """Mirror each point across the plane of the matching face."""
+        return self.geometry.mirror_sources(points, face_ids)
 
-    def find_image_sources(self, source, order, current_order):
+    def find_image_sources(self, source, order):
         """Find the image sources."""
-        if current_order > order:
-            return []
-        image_sources = []
-        for face in self.mesh.faces:
-            mirrored_source = self.mirror_source(source, face)
-            image_sources.append((mirrored_source, current_order))
-            image_sources.extend(
-                self.find_image_sources(mirrored_source, order, current_order + 1)
-            )
-        return image_sources
+        with self.instrumentation.phase("image_sources"):
+            if self.cache is not None:
+                tree = self.cache.load_image_sources(
+                    self.file_path,
+                    source,
+                    order,
+                    lambda: ImageSourceTree.build(self.geometry.polygons, source, order),
+                )
+            else:
+                tree = ImageSourceTree.build(self.geometry.polygons, source, order)
+        self.instrumentation.count("image_sources", len(tree))
+        return tree
 
     def shoot_ray(self, r_origin, r_direction):
         """Shoot a ray and return the hit location and face index."""
@@ -65,64 +190,447 @@ class MirrorImageMethod:
         )
         return locations, index_triangle
 
+    def shoot_rays(self, origins, directions):
+        """Shoot a batch of rays and return the first hit of each ray.
+
+        Returns an (N,3) array of hit locations and an (N,) array of face
+        indices, where rays that miss the mesh have face index -1.
+        """
+        # Den Startpunkt leicht verschieben, damit die Wand, von der der
+        # Strahl reflektiert wurde, nicht erneut getroffen wird
+        offset_origins = origins + SELF_HIT_EPSILON * directions
+        self.instrumentation.count("intersection_queries")
+        self.instrumentation.count("rays_shot", len(origins))
+        with self.instrumentation.phase("intersection"):
+            if self.ray_backend == "box":
+                # Die Wand wird nach der Richtung gewaehlt, ein Versatz ist nicht noetig
+                locations, face_indices, _ = self.box.intersect_first(origins, directions)
+                return locations, face_indices
+            if self.bvh is not None:
+                locations, face_indices, _ = self.bvh.intersect_first(offset_origins, directions)
+                return locations, face_indices
+            hit_locations, index_ray, index_triangle = self.mesh.ray.intersects_location(
+                offset_origins, directions, multiple_hits=False
+            )
+        locations = np.full((len(origins), 3), np.nan)
+        face_indices = np.full(len(origins), -1, dtype=np.int64)
+        locations[index_ray] = hit_locations
+        face_indices[index_ray] = index_triangle
+        return locations, face_indices
+
+    def trace_rays(self, origins, directions, energies, targets=None, rng=None):
+        """Trace a front of rays through all reflection orders at once.
+
+        The active rays are kept as (N,3) arrays, every order needs a single
+        intersection query, and rays are dropped from the front as soon as
+        they hit the target or leave the mesh. Returns the rays that hit the
+        target as a PathStore.
+
+        A target counts as hit when the segment between a ray's origin and its
+        wall hit passes through the target sphere; the path then ends at the
+        point of the segment closest to the target's center. With a list of
+        targets, every segment is tested against all of them in one operation
+        (through a spatial index when there are many), a ray keeps going until
+        it has hit every target, and one PathStore per target is returned.
+
+        Rays carry one energy per frequency band of the material table, and
+        every reflection multiplies them by the reflection coefficients of
+        the face that was hit, as Ray.reflect does for a single band. With an
+        energy threshold, a ray whose strongest band energy over its squared
+        travelled distance (the apply_energy_loss model, an upper bound of
+        what it can still deliver) falls below the threshold is terminated.
+        With Russian roulette it instead survives with probability
+        level / threshold and its energy is divided by that probability,
+        which keeps the expected energy unbiased.
+        """
+        single = targets is None
+        if single:
+            targets = [self.target]
+        origins = np.array(origins, dtype=float)
+        directions = np.array(directions, dtype=float)
+        directions /= lin.norm(directions, axis=1)[:, np.newaxis]
+        num_rays = len(origins)
+        energies = np.atleast_1d(np.asarray(energies, dtype=float))
+        if energies.ndim == 1:
+            energies = energies[:, np.newaxis]
+        energies = np.array(np.broadcast_to(energies, (num_rays, self.materials.num_bands)))
+        travelled = np.zeros(num_rays)
+        self.instrumentation.count("rays_traced", len(origins))
+        active = np.arange(len(origins))
+        pending = np.ones((len(origins), len(targets)), dtype=bool)
+        receivers = Receivers.from_targets(targets)
+        normals = self.geometry.normals
+        reflection = self.materials.reflection
+        segments = []
+        target_hits = []
+
+        for current_order in range(self.order + 1):
+            if not active.size:
+                break
+            locations, face_indices = self.shoot_rays(origins, directions)
+            hit_mesh = face_indices >= 0
+            origins, directions = origins[hit_mesh], directions[hit_mesh]
+            locations, face_indices = locations[hit_mesh], face_indices[hit_mesh]
+            active, pending = active[hit_mesh], pending[hit_mesh]
+            energies, travelled = energies[hit_mesh], travelled[hit_mesh]
+
+            lengths = lin.norm(locations - origins, axis=1)
+            self.instrumentation.count("target_tests", len(origins) * len(targets))
+            with self.instrumentation.phase("target_tests"):
+                hits = receivers.intersect(origins, directions, lengths)
+            first = pending[hits.segments, hits.receivers]
+            rows, target_ids = hits.segments[first], hits.receivers[first]
+            target_hits.append(
+                {
+                    "ray": active[rows],
+                    "target": target_ids,
+                    "order": np.full(len(rows), current_order),
+                    "hit_location": hits.closest_points[first],
+                }
+            )
+            segments.append(
+                {
+                    "ray": active,
+                    "order": np.full(len(active), current_order),
+                    "origin": origins,
+                    "direction": directions,
+                    "reflection_point": locations,
+                    "face_index": face_indices,
+                    "energy": energies,
+                }
+            )
+
+            pending[hits.segments, hits.receivers] = False
+            keep = pending.any(axis=1)
+            travelled = travelled + lengths
+            energies = energies * reflection[face_indices]
+            if self.energy_threshold is not None:
+                survive = self.survives_threshold(energies, travelled, rng)
+                self.instrumentation.count("rays_terminated", np.count_nonzero(keep & ~survive))
+                keep &= survive
+
+            # Spiegelung der Richtung an der getroffenen Wand
+            origins, directions = locations[keep], directions[keep]
+            face_normals = normals[face_indices[keep]]
+            directions = directions - 2 * np.einsum(
+                "ij,ij->i", directions, face_normals
+            )[:, np.newaxis] * face_normals
+            active, pending = active[keep], pending[keep]
+            energies, travelled = energies[keep], travelled[keep]
+
+        if not segments:
+            stores = [PathStore.empty(self.order) for _ in targets]
+        else:
+            columns = concatenate_columns(segments)
+            hits = concatenate_columns(target_hits)
+            stores = [
+                self.paths_to_target(columns, hits, target_id, num_rays)
+                for target_id in range(len(targets))
+            ]
+        return stores[0] if single else stores
+
+    def survives_threshold(self, energies, travelled, rng=None):
+        """Return which rays stay above the energy threshold, applying Russian roulette.
+
+        Energies of rays that survive the roulette are boosted in place.
+        """
+        with np.errstate(divide="ignore"):
+            level = energies.max(axis=1) / travelled**2
+        low = level < self.energy_threshold
+        if not self.russian_roulette:
+            return ~low
+        probability = level[low] / self.energy_threshold
+        random = np.random.random if rng is None else rng.random
+        survivors = random(len(probability)) < probability
+        low_ids = np.flatnonzero(low)
+        energies[low_ids[survivors]] /= probability[survivors, np.newaxis]
+        survive = ~low
+        survive[low_ids[survivors]] = True
+        return survive
+
+    def paths_to_target(self, columns, hits, target_id, num_rays):
+        """Collect the segments of the rays that hit one target into a PathStore.
+
+        A path consists of all segments of its ray up to the order in which the
+        ray hit the target; that last segment gets the hit location.
+        """
+        selected = hits["target"] == target_id
+        hit_rays, hit_orders = hits["ray"][selected], hits["order"][selected]
+        path_of_ray = np.full(num_rays, -1)
+        path_of_ray[hit_rays] = np.arange(len(hit_rays))
+        order_of_ray = np.full(num_rays, -1)
+        order_of_ray[hit_rays] = hit_orders
+
+        ray_ids = columns["ray"]
+        kept = (path_of_ray[ray_ids] >= 0) & (columns["order"] <= order_of_ray[ray_ids])
+        segment = {key: column[kept] for key, column in columns.items()}
+        ray_ids = segment.pop("ray")
+        path = path_of_ray[ray_ids]
+
+        hit_location = np.full((len(ray_ids), 3), np.nan)
+        last = segment["order"] == order_of_ray[ray_ids]
+        hit_location[last] = hits["hit_location"][selected][path[last]]
+        return PathStore.from_arrays(
+            self.order,
+            path=path,
+            hit_location=hit_location,
+            **segment,
+        )
+
+    def is_occluded(self, starts, ends):
+        """Check whether the segments between two point sets are blocked by the mesh."""
+        directions = ends - starts
+        lengths = lin.norm(directions, axis=1)
+        directions = directions / lengths[:, np.newaxis]
+        locations, face_indices = self.shoot_rays(starts, directions)
+        distances = lin.norm(locations - starts, axis=1)
+        return (face_indices >= 0) & (distances < lengths - OCCLUSION_TOLERANCE)
+
+    def calculate_image_source_paths(self, target=None, min_order=0):
+        """Calculate every valid specular path by back-tracing the image sources.
+
+        Each image source of min_order or above is connected to the receiver
+        at the target position (of the given target, or of the room's own target).
+        Going back through its parents, every segment has to cross the plane of
+        its polygon inside one of the polygon's triangles, and no segment may be
+        blocked by another part of the mesh. The result has the same layout as
+        the stochastic paths, with the triangles that were hit as faces.
+
+        In an axis-aligned box room with source and receiver strictly inside, the
+        paths come from the closed-form lattice of BoxRoom instead.
+        """
+        target = self.target if target is None else target
+        receiver = np.asarray(target.position, dtype=float)
+        if self.box is not None and self.box.contains(np.array([self.source, receiver]), strict=True).all():
+            return self.box.image_source_paths(
+                self.source, receiver, self.order, self.materials.reflection, min_order
+            )
+
+        stores = []
+        tree = self.image_sources
+        polygons = self.geometry.polygons
+
+        for current_order in range(min_order, self.order + 1):
+            images = tree.of_order(current_order)
+            if not images.size:
+                continue
+            # chain[j] ist das Spiegelbild der Ordnung j auf dem Weg zum Bild
+            chain = [images]
+            for _ in range(current_order):
+                chain.insert(0, tree.parents[chain[0]])
+
+            valid = np.ones(len(images), dtype=bool)
+            points = [np.tile(receiver, (len(images), 1))]
+            # faces[j] ist das getroffene Dreieck der Reflexion j im Polygon des Bildes
+            faces = [np.full(len(images), -1)]
+            for j in range(current_order, 0, -1):
+                polygon_ids = tree.faces[chain[j]]
+                reflection_points, t = polygons.intersect_planes(
+                    tree.positions[chain[j]], points[0], polygon_ids
+                )
+                valid &= (t > 0) & (t < 1)
+                faces.insert(0, polygons.locate(reflection_points, polygon_ids))
+                valid &= faces[0] >= 0
+                points.insert(0, reflection_points)
+            points.insert(0, tree.positions[chain[0]])
+            faces.insert(0, np.full(len(images), -1))
+
+            points = [p[valid] for p in points]
+            faces = [f[valid] for f in faces]
+            if not len(points[0]):
+                continue
+
+            starts = np.concatenate(points[:-1])
+            ends = np.concatenate(points[1:])
+            occluded = self.is_occluded(starts, ends).reshape(current_order + 1, -1)
+            visible = ~occluded.any(axis=0)
+
+            points = [p[visible] for p in points]
+            faces = [f[visible] for f in faces]
+            count = len(points[0])
+            nan_points = np.full((count, 3), np.nan)
+            energy = np.ones((count, self.materials.num_bands))
+            segments = []
+            for j in range(current_order + 1):
+                is_last = j == current_order
+                if j:
+                    energy = energy * self.materials.reflection[faces[j]]
+                segments.append(
+                    {
+                        "path": np.arange(count),
+                        "order": np.full(count, j),
+                        "origin": points[j],
+                        "direction": points[j + 1] - points[j],
+                        "reflection_point": nan_points if is_last else points[j + 1],
+                        "hit_location": points[j + 1] if is_last else nan_points,
+                        "face_index": faces[j + 1],
+                        "energy": energy,
+                    }
+                )
+            columns = concatenate_columns(segments)
+            stores.append(PathStore.from_arrays(self.order, **columns))
+
+        return PathStore.concatenate(stores, self.order)
+
+    def trace_chunk(self, n, seed):
+        """Trace n rays from the source, sampled from a generator with the given seed."""
+        rng = np.random.default_rng(seed)
+        directions = sample_directions(self.sampler, n, rng)
+        origins = np.tile(self.source, (n, 1))
+        return self.trace_rays(origins, directions, 1.0, rng=rng)
+
     def calculate_paths(self):
-        """Calculate the paths of the sound waves."""
-        paths = {i: [] for i in range(self.order + 1)}
-
-        while not any(paths.values()):  # Repeat until at least one path hits the target
-            initial_rays = Ray.generate_random_rays(self.source, self.initial_rays)
-
-            for ray in initial_rays:
-                path = SoundPath()
-                current_ray = ray
-                current_order = 0
-                while current_order <= self.order:
-                    locations, index_triangle = self.shoot_ray(
-                        current_ray.origin, current_ray.direction
-                    )
-                    if not locations.size:
-                        break
-
-                    hit_location = locations[0]
-                    face_index = index_triangle[0]
-                    mirrored_source, _ = self.image_sources[index_triangle[0]]
-
-                    if self.target.is_hitted_by_ray(current_ray):
-                        if (
-                            np.dot(
-                                current_ray.direction,
-                                self.target.position - current_ray.origin,
-                            )
-                            > 0
-                        ):
-                            self.target.set_hit_location(current_ray)
-                            path.add_ray(
-                                current_ray.origin,
-                                current_ray.direction,
-                                hit_location,
-                                current_order,
-                                face_index,
-                                current_ray.energy,
-                                current_ray.hit_location,
-                            )
-                            paths[current_order].append(path)
-                            break
-                    else:
-                        path.add_ray(
-                            current_ray.origin,
-                            current_ray.direction,
-                            hit_location,
-                            current_order,
-                            face_index,
-                            current_ray.energy,
-                            None,
-                        )
-
-                    reflection_direction = hit_location - mirrored_source
-                    reflection_direction /= lin.norm(reflection_direction)
-                    current_ray = Ray(
-                        hit_location, reflection_direction, current_ray.energy
-                    )
-                    current_order += 1
-
-        return paths
+        """Calculate the paths of the sound waves.
+
+        With hits_per_order or relative_error, rays are traced by the
+        AdaptiveSampler until the stopping rule is met. Otherwise a seed or
+        several workers use the ParallelTracer, and a plain run traces
+        initial_rays rays and keeps going, focusing on the first hits,
+        until a path reaches the target. Both stop at max_rays, by default
+        100 times initial_rays, and then return the paths found so far.
+        """
+        if self.mode == "deterministic":
+            return self.calculate_image_source_paths()
+        if self.keep_rays:
+            return self.trace_front()
+        adaptive = self.hits_per_order is not None or self.relative_error is not None
+        if not adaptive and (self.workers > 1 or self.seed is not None):
+            tracer = ParallelTracer(self, self.workers, self.chunk_size, self.seed, self.max_rays)
+            return tracer.calculate_paths()
+
+        self.adaptive_sampler = AdaptiveSampler(
+            self,
+            batch_size=self.chunk_size,
+            hits_per_order=self.hits_per_order,
+            relative_error=self.relative_error,
+            max_rays=self.max_rays,
+            rng=np.random.default_rng(self.seed),
+        )
+        return self.adaptive_sampler.run()
+
+    def trace_front(self):
+        """Trace initial_rays rays into a RayFront, keep it and return the paths to the target."""
+        rng = np.random.default_rng(self.seed)
+        directions = sample_directions(self.sampler, self.initial_rays, rng)
+        origins = np.tile(self.source, (self.initial_rays, 1))
+        self.ray_front = RayFront(self, origins, directions, 1.0, rng).advance(self.order)
+        return self.ray_front.paths_to([self.target])[0]
+
+    def set_source(self, source):
+        """Move the source, keeping the mesh, BVH and materials.
+
+        The image sources and traced rays depend on the source and are
+        dropped; paths are recalculated if the room had calculated them.
+        """
+        self.source = source
+        self._image_sources = None
+        self.ray_front = None
+        self.update_paths(self.calculate_paths)
+
+    def set_target(self, target):
+        """Move the target, reusing the image sources or the traced rays.
+
+        With a kept RayFront only the receiver tests run again; in
+        deterministic mode only the back-tracing to the new receiver does.
+        """
+        self.target = target
+        if self.ray_front is not None:
+            self.update_paths(lambda: self.ray_front.paths_to([target])[0])
+        else:
+            self.update_paths(self.calculate_paths)
+
+    def set_order(self, order):
+        """Change the reflection order without redoing the lower orders.
+
+        A higher order extends the image-source tree and the kept RayFront;
+        deterministic paths are only calculated for the new orders. A lower
+        order keeps everything and leaves out the higher orders.
+        """
+        previous = self.order
+        self.order = order
+        if self._image_sources is not None:
+            tree = self._image_sources
+            if order > previous:
+                self._image_sources = tree.extend(self.geometry.polygons, order)
+            elif order < previous:
+                keep = tree.orders <= order
+                self._image_sources = ImageSourceTree(
+                    tree.positions[keep], tree.parents[keep], tree.faces[keep], tree.orders[keep]
+                )
+        if self.path_store is None:
+            return
+
+        if self.ray_front is not None:
+            self.ray_front.advance(order)
+            self.update_paths(lambda: self.ray_front.paths_to([self.target], order)[0])
+        elif self.mode == "deterministic" and order > previous:
+            self.update_paths(
+                lambda: PathStore.concatenate(
+                    [self.path_store, self.calculate_image_source_paths(min_order=previous + 1)],
+                    order,
+                )
+            )
+        elif self.mode == "deterministic":
+            store = self.path_store
+            self.update_paths(lambda: store.select(np.flatnonzero(store.path_orders() <= order)))
+        else:
+            self.update_paths(self.calculate_paths)
+
+    def update_paths(self, calculate):
+        """Replace the paths with the result of calculate, if the room had calculated paths."""
+        self._paths = None
+        if self.path_store is None:
+            return
+        with self.instrumentation.phase("paths"):
+            self.path_store = calculate()
+        self.path_store.max_order = self.order
+
+    def iter_paths(self, chunk_size=None, hits_per_order=None, max_rays=None, rng=None):
+        """Trace rays of the room's sampler in chunks and yield the hit paths of every chunk.
+
+        Each yielded item is a PathStore, so callers can feed it into an
+        accumulator or write it to disk with bounded memory. The generator
+        stops after max_rays rays, or once every order has hits_per_order
+        paths; with hits_per_order the last batch is trimmed so no order gets
+        more. Without either limit it runs until the caller stops iterating.
+        Orders that the target cannot be reached in never fill up, so
+        hits_per_order is best combined with max_rays.
+        """
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        rng = np.random.default_rng() if rng is None else rng
+        sampler = DirectionSampler(self.sampler, rng)
+        hits = np.zeros(self.order + 1, dtype=np.int64)
+        traced = 0
+        while max_rays is None or traced < max_rays:
+            n = chunk_size if max_rays is None else min(chunk_size, max_rays - traced)
+            directions = sampler.sample(n)
+            origins = np.tile(self.source, (n, 1))
+            store = self.trace_rays(origins, directions, 1.0, rng=rng)
+            traced += n
+
+            if hits_per_order is not None:
+                orders = store.path_orders()
+                # Pro Ordnung nur so viele Pfade behalten, wie noch fehlen
+                rank = np.zeros(len(store), dtype=np.int64)
+                for current_order in range(self.order + 1):
+                    in_order = orders == current_order
+                    rank[in_order] = hits[current_order] + np.arange(in_order.sum())
+                store = store.select(np.flatnonzero(rank < hits_per_order))
+            hits += np.bincount(store.path_orders(), minlength=self.order + 1)
+            yield store
+
+            if hits_per_order is not None and (hits >= hits_per_order).all():
+                return
+
+    def impulse_response(self, sample_rate=44100, speed_of_sound=343.0, duration=None, per_band=False):
+        """Bin the calculated paths into a sampled room impulse response.
+
+        With per_band, the response has one row per band of the material table.
+        """
+        return ImpulseResponse.from_paths(
+            self.path_store,
+            sample_rate=sample_rate,
+            speed_of_sound=speed_of_sound,
+            duration=duration,
+            bands=self.materials.bands if per_band else None,
+        )
@@ -0,0 +1,127 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from adaptive import default_max_rays, warn_ray_limit
+from path_store import PathStore
+
+# Rays per chunk when no chunk size is given. It is fixed, so the same seed
+# gives the same chunks and therefore the same paths for any worker count.
+DEFAULT_CHUNK_SIZE = 2048
+
+# Room of the current worker process, loaded once by _init_worker
+_worker_room = None
+
+
+def _init_worker(room_class, room_args):
+    """Load the mesh and the ray backend once per worker process.
+
+    The room is built without paths, and its image sources are only built
+    on first use, which tracing chunks never needs. With ``instrument`` in
+    the room arguments, the worker room counts and times its chunks.
+    """
+    global _worker_room
+    _worker_room = room_class(**room_args, compute_paths=False)
+
+
+def _trace_chunk(task):
+    """Trace one chunk and return its paths with the chunk's RunSummary (None if not instrumented)."""
+    n, seed = task
+    instrumentation = _worker_room.instrumentation
+    instrumentation.reset()
+    store = _worker_room.trace_chunk(n, seed)
+    return store, instrumentation.summary()
+
+
+def split_rays(n, chunk_size):
+    """Split n rays into chunk sizes of at most chunk_size."""
+    sizes = [chunk_size] * (n // chunk_size)
+    if n % chunk_size:
+        sizes.append(n % chunk_size)
+    return sizes
+
+
+class ParallelTracer:
+    """Traces the initial rays of a room in seeded chunks, optionally in a process pool.
+
+    Every chunk draws its directions from its own generator, spawned from one
+    SeedSequence in chunk order. Results are merged in chunk order, so a seed
+    and chunk size give the same paths whether one or many workers are used.
+    Like the AdaptiveSampler without a stopping rule, it traces further
+    rounds of ``initial_rays`` and keeps all chunks until a path hits the
+    target or ``max_rays`` rays were traced.
+    """
+
+    def __init__(self, room, workers=1, chunk_size=None, seed=None, max_rays=None):
+        self.room = room
+        self.workers = workers
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.seed = seed
+        self.max_rays = default_max_rays(room, max_rays)
+
+    def room_args(self):
+        """Arguments to rebuild the room in a worker process."""
+        room = self.room
+        return dict(
+            file_path=room.file_path,
+            source=room.source,
+            target=room.target,
+            order=room.order,
+            reflection_coefficient=room.reflection_coefficient,
+            initial_rays=room.initial_rays,
+            mode=room.mode,
+            sampler=room.sampler,
+            ray_backend=room.ray_backend,
+            cache=room.cache,
+            materials=room.materials,
+            energy_threshold=room.energy_threshold,
+            russian_roulette=room.russian_roulette,
+            instrument=room.instrumentation.enabled,
+        )
+
+    def _collect(self, results):
+        """Merge the counters and timings of worker chunks into the room and return their paths."""
+        stores = []
+        for store, summary in results:
+            if summary is not None:
+                self.room.instrumentation.merge(summary)
+            stores.append(store)
+        return stores
+
+    def calculate_paths(self):
+        """Calculate the paths, tracing more chunks until a path hits the target or max_rays is reached."""
+        seed_sequence = np.random.SeedSequence(self.seed)
+        room = self.room
+        instrumentation = room.instrumentation
+
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(type(room), self.room_args()),
+            )
+        results = []
+        hits = 0
+        rays_traced = 0
+        try:
+            while not hits:
+                if rays_traced >= self.max_rays:
+                    warn_ray_limit(room, rays_traced)
+                    break
+                if rays_traced:
+                    instrumentation.count("retries")
+                n = min(room.initial_rays, self.max_rays - rays_traced)
+                sizes = split_rays(n, self.chunk_size)
+                instrumentation.count("chunks", len(sizes))
+                tasks = list(zip(sizes, seed_sequence.spawn(len(sizes))))
+                if executor is None:
+                    stores = [room.trace_chunk(n, seed) for n, seed in tasks]
+                else:
+                    stores = self._collect(executor.map(_trace_chunk, tasks))
+                # Alle bisherigen Chunks behalten, nicht nur die letzte Runde
+                results.extend(stores)
+                hits += sum(len(store) for store in stores)
+                rays_traced += n
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return PathStore.concatenate(results, room.order)
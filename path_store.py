@@ -0,0 +1,204 @@
+import numpy as np
+from utils import SoundPath
+
+# One row per traced segment. Missing points are NaN, a missing face is -1.
+SEGMENT_DTYPE = np.dtype(
+    [
+        ("path", np.int64),
+        ("order", np.int64),
+        ("face_index", np.int64),
+        ("origin", np.float64, 3),
+        ("direction", np.float64, 3),
+        ("reflection_point", np.float64, 3),
+        ("hit_location", np.float64, 3),
+        ("distance", np.float64),
+        ("energy", np.float64),
+        ("energy_loss", np.float64),
+    ]
+)
+
+
+class PathStore:
+    """Segments of all sound paths in one structured array.
+
+    Rows are sorted by path id and, within a path, by order. Path ids run
+    from 0 to ``len(store) - 1``, so per-path values are computed for all
+    paths at once with ``np.add.reduceat`` over the segment rows.
+
+    ``band_energy`` holds the energy of every segment per frequency band as
+    an (S,B) array next to the segments; the ``energy`` field is its mean.
+    Without it, the ``energy`` field is used as a single band.
+    """
+
+    def __init__(self, segments, max_order, band_energy=None):
+        self.segments = segments
+        self.max_order = max_order
+        if band_energy is None:
+            band_energy = segments["energy"][:, np.newaxis]
+        self.band_energy = band_energy
+        path_ids = segments["path"]
+        self.starts = np.flatnonzero(np.r_[True, path_ids[1:] != path_ids[:-1]])
+        if not len(segments):
+            self.starts = self.starts[:0]
+
+    @classmethod
+    def empty(cls, max_order):
+        return cls(np.zeros(0, dtype=SEGMENT_DTYPE), max_order)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        max_order,
+        path,
+        order,
+        origin,
+        direction,
+        reflection_point,
+        hit_location,
+        face_index,
+        energy,
+    ):
+        """Build a store from segment columns, computing distances and energy losses.
+
+        ``energy`` is either one value per segment or an (S,B) array of band energies.
+        """
+        energy = np.asarray(energy, dtype=float)
+        band_energy = None
+        if energy.ndim == 2:
+            band_energy = energy
+            energy = energy.mean(axis=1)
+        segments = np.zeros(len(path), dtype=SEGMENT_DTYPE)
+        segments["path"] = path
+        segments["order"] = order
+        segments["face_index"] = face_index
+        segments["origin"] = origin
+        segments["direction"] = direction / np.linalg.norm(direction, axis=1)[:, np.newaxis]
+        segments["reflection_point"] = reflection_point
+        segments["hit_location"] = hit_location
+        segments["energy"] = energy
+
+        # Wie in SoundPath.add_ray: der Trefferpunkt am Ziel hat Vorrang
+        end = np.where(np.isnan(hit_location), reflection_point, hit_location)
+        distance = np.linalg.norm(origin - end, axis=1)
+        segments["distance"] = distance
+        with np.errstate(divide="ignore", invalid="ignore"):
+            segments["energy_loss"] = np.where(distance > 0, energy / distance**2, 0.0)
+
+        rows = np.lexsort((segments["order"], segments["path"]))
+        if band_energy is not None:
+            band_energy = band_energy[rows]
+        return cls(segments[rows], max_order, band_energy)
+
+    @classmethod
+    def concatenate(cls, stores, max_order):
+        """Join stores, renumbering the paths of each store after the previous ones."""
+        parts = []
+        band_parts = []
+        offset = 0
+        for store in stores:
+            if not len(store):
+                continue
+            segments = store.segments.copy()
+            segments["path"] += offset
+            parts.append(segments)
+            band_parts.append(store.band_energy)
+            offset += len(store)
+        if not parts:
+            return cls.empty(max_order)
+        return cls(np.concatenate(parts), max_order, np.concatenate(band_parts))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def select(self, path_ids):
+        """Return a new store with only the given paths, renumbered in the given order."""
+        path_ids = np.asarray(path_ids, dtype=np.int64)
+        new_ids = np.full(len(self), -1)
+        new_ids[path_ids] = np.arange(len(path_ids))
+        rows = np.flatnonzero(new_ids[self.segments["path"]] >= 0)
+        segments = self.segments[rows]
+        segments["path"] = new_ids[segments["path"]]
+        order = np.lexsort((segments["order"], segments["path"]))
+        return PathStore(segments[order], self.max_order, self.band_energy[rows[order]])
+
+    def ends(self):
+        """Return the row index of the last segment of every path."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        return np.r_[self.starts[1:], len(self.segments)].astype(np.int64) - 1
+
+    def path_orders(self):
+        """Return the reflection order of every path (the order of its last segment)."""
+        return self.segments["order"][self.ends()]
+
+    def total_distances(self):
+        """Return the travelled distance of every path."""
+        if not len(self):
+            return np.zeros(0)
+        distance = self.segments["distance"]
+        return np.add.reduceat(np.where(distance > 0, distance, 0.0), self.starts)
+
+    def calculate_total_travel_time(self, speed_of_sound=343.0):
+        """Calculate the total travel time of every path."""
+        return self.total_distances() / speed_of_sound
+
+    def num_bands(self):
+        return self.band_energy.shape[1]
+
+    def arrival_band_energies(self):
+        """Return the band energies of every path at the target, shape (P,B).
+
+        The energy of the last segment, which includes every reflection, is
+        spread over the whole distance with 1/r^2.
+        """
+        distances = self.total_distances()
+        energies = self.band_energy[self.ends()]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(distances[:, np.newaxis] > 0, energies / distances[:, np.newaxis] ** 2, 0.0)
+
+    def calculate_energy_loss_of_all(self):
+        """Calculate the energy loss of every path over its whole distance."""
+        total_distance = self.total_distances()
+        energy = self.segments["energy"][self.starts]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(total_distance > 0, energy / total_distance**2, 0.0)
+
+    def group_by_order(self):
+        """Return the path ids of every reflection order."""
+        orders = self.path_orders()
+        return {i: np.flatnonzero(orders == i) for i in range(self.max_order + 1)}
+
+    def path(self, path_id):
+        """Return one path as a SoundPath."""
+        start = self.starts[path_id]
+        end = self.starts[path_id + 1] if path_id + 1 < len(self) else len(self.segments)
+        path = SoundPath()
+        for row in self.segments[start:end]:
+            path.travelPath.append(
+                {
+                    "origin": row["origin"],
+                    "direction": row["direction"],
+                    "reflection_point": _optional_point(row["reflection_point"]),
+                    "order": int(row["order"]),
+                    "distance": row["distance"],
+                    "face_index": int(row["face_index"]) if row["face_index"] >= 0 else None,
+                    "energy": row["energy"],
+                    "energy_loss": row["energy_loss"],
+                    "hit_location": _optional_point(row["hit_location"]),
+                }
+            )
+        return path
+
+    def to_paths_dict(self):
+        """Return the paths grouped by order as lists of SoundPath objects."""
+        return {
+            order: [self.path(path_id) for path_id in path_ids]
+            for order, path_ids in self.group_by_order().items()
+        }
+
+    def __repr__(self):
+        return f"PathStore with {len(self)} paths and {len(self.segments)} segments."
+
+
+def _optional_point(point):
+    return None if np.isnan(point).any() else point
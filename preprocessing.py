@@ -0,0 +1,200 @@
+import warnings
+from collections import deque
+import numpy as np
+import trimesh
+from geometry import FaceGeometry
+
+# Allowed deviation of merged coplanar triangles: 1 - cos of the angle between
+# their normals, and the distance of their planes relative to the size of the mesh
+COPLANAR_TOLERANCE = 1e-6
+
+# Vertices that agree in this many decimal digits relative to the size of the mesh are welded
+VERTEX_DIGITS = 9
+
+
+def weld_vertices(vertices, faces):
+    """Return the faces with every vertex replaced by the first vertex at the same position.
+
+    OBJ files often repeat a position once per normal or texture coordinate,
+    which would make neighbouring faces look unconnected.
+    """
+    scale = np.abs(vertices).max() if len(vertices) else 1.0
+    keys = np.round(vertices / scale, VERTEX_DIGITS)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return first[inverse.ravel()][faces]
+
+
+def edge_pairs(faces):
+    """Find the faces that share an edge.
+
+    Returns the (E,2) face pairs of all edges with exactly two faces, whether
+    both faces run along the shared edge in the same direction (their winding
+    disagrees), and the numbers of boundary edges (one face) and non-manifold
+    edges (more than two faces).
+    """
+    directed = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    edge_faces = np.repeat(np.arange(len(faces)), 3)
+    undirected = np.sort(directed, axis=1)
+    forward = directed[:, 0] < directed[:, 1]
+
+    _, inverse, counts = np.unique(undirected, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    starts = np.cumsum(counts) - counts
+    shared = starts[counts == 2]
+    first, second = order[shared], order[shared + 1]
+    pairs = np.stack((edge_faces[first], edge_faces[second]), axis=1)
+    same_direction = forward[first] == forward[second]
+    return pairs, same_direction, int(np.count_nonzero(counts == 1)), int(np.count_nonzero(counts > 2))
+
+
+def connected_components(count, pairs):
+    """Label the connected components of a graph of count nodes and (E,2) edges."""
+    labels = np.arange(count)
+    while True:
+        # Jeder Knoten uebernimmt das kleinste Label seiner Nachbarn
+        smaller = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, pairs[:, 0], smaller)
+        np.minimum.at(updated, pairs[:, 1], smaller)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return np.unique(labels, return_inverse=True)[1].ravel()
+        labels = updated
+
+
+def orient_faces(vertices, faces):
+    """Wind all faces consistently, with the normals pointing into the room.
+
+    Neighbouring faces are flipped to agree with each other, component by
+    component. The component with the largest enclosed volume is the room
+    and faces inwards (negative volume); every other component is an object
+    inside the room and faces outwards. Returns the oriented faces, the
+    number of flipped faces and the number of edges whose faces cannot be
+    made to agree (a non-orientable mesh).
+    """
+    pairs, same_direction, _, _ = edge_pairs(weld_vertices(vertices, faces))
+    neighbours = [[] for _ in range(len(faces))]
+    for (a, b), flip in zip(pairs.tolist(), same_direction.tolist()):
+        neighbours[a].append((b, flip))
+        neighbours[b].append((a, flip))
+
+    flipped = np.zeros(len(faces), dtype=bool)
+    component = np.full(len(faces), -1)
+    conflicts = 0
+    for seed in range(len(faces)):
+        if component[seed] >= 0:
+            continue
+        component[seed] = seed
+        queue = deque([seed])
+        while queue:
+            face = queue.popleft()
+            for neighbour, flip in neighbours[face]:
+                if component[neighbour] < 0:
+                    component[neighbour] = seed
+                    flipped[neighbour] = flipped[face] ^ flip
+                    queue.append(neighbour)
+                elif flipped[neighbour] != flipped[face] ^ flip:
+                    conflicts += 1
+
+    faces = np.where(flipped[:, np.newaxis], faces[:, ::-1], faces)
+    triangles = vertices[faces]
+    volumes = np.einsum("ij,ij->i", triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])) / 6
+    labels = np.unique(component, return_inverse=True)[1].ravel()
+    component_volumes = np.bincount(labels, weights=volumes)
+    room = np.argmax(np.abs(component_volumes))
+    # Der Raum hat ein negatives Volumen, Objekte darin ein positives
+    wrong = np.where(
+        np.arange(len(component_volumes)) == room, component_volumes > 0, component_volumes < 0
+    )
+    faces = np.where(wrong[labels][:, np.newaxis], faces[:, ::-1], faces)
+    flipped ^= wrong[labels]
+    return faces, int(np.count_nonzero(flipped)), conflicts // 2
+
+
+def coplanar_polygons(geometry, pairs, tolerance=COPLANAR_TOLERANCE):
+    """Assign every face to a polygon of adjacent faces that share a plane."""
+    scale = np.ptp(geometry.triangles.reshape(-1, 3), axis=0).max() if len(geometry) else 1.0
+    a, b = pairs[:, 0], pairs[:, 1]
+    coplanar = (
+        np.einsum("ij,ij->i", geometry.normals[a], geometry.normals[b]) >= 1 - tolerance
+    ) & (np.abs(geometry.offsets[a] - geometry.offsets[b]) <= tolerance * scale)
+    return connected_components(len(geometry), pairs[coplanar])
+
+
+class MeshReport:
+    """What the preprocessing found and fixed in a mesh.
+
+    A watertight mesh has every edge shared by exactly two faces, and all
+    faces wound consistently.
+    """
+
+    def __init__(self, faces, polygons, flipped_faces, boundary_edges, nonmanifold_edges, conflicts):
+        self.faces = faces
+        self.polygons = polygons
+        self.flipped_faces = flipped_faces
+        self.boundary_edges = boundary_edges
+        self.nonmanifold_edges = nonmanifold_edges
+        self.conflicts = conflicts
+
+    @property
+    def watertight(self):
+        return self.boundary_edges == 0 and self.nonmanifold_edges == 0 and self.conflicts == 0
+
+    def as_array(self):
+        return np.array(
+            [
+                self.faces,
+                self.polygons,
+                self.flipped_faces,
+                self.boundary_edges,
+                self.nonmanifold_edges,
+                self.conflicts,
+            ]
+        )
+
+    @classmethod
+    def from_array(cls, values):
+        return cls(*(int(value) for value in values))
+
+    def __repr__(self):
+        state = "watertight" if self.watertight else (
+            f"not watertight: {self.boundary_edges} boundary edges, "
+            f"{self.nonmanifold_edges} non-manifold edges, {self.conflicts} winding conflicts"
+        )
+        return (
+            f"MeshReport of {self.faces} faces in {self.polygons} polygons, "
+            f"{self.flipped_faces} faces flipped, {state}."
+        )
+
+
+def preprocess(mesh, merge_coplanar=True):
+    """Orient, check and merge a loaded mesh.
+
+    Returns the oriented mesh, its FaceGeometry with inward normals and the
+    polygons of adjacent coplanar faces, and the MeshReport. The triangles
+    keep their indices; only their winding changes.
+    """
+    faces, flipped, conflicts = orient_faces(mesh.vertices, np.asarray(mesh.faces))
+    mesh = trimesh.Trimesh(mesh.vertices, faces, process=False)
+    pairs, _, boundary, nonmanifold = edge_pairs(weld_vertices(mesh.vertices, faces))
+    geometry = FaceGeometry.from_mesh(mesh, orientation=1.0)
+    if merge_coplanar:
+        geometry.face_polygons = coplanar_polygons(geometry, pairs)
+    report = MeshReport(
+        len(faces), len(geometry.polygons), flipped, boundary, nonmanifold, conflicts
+    )
+    return mesh, geometry, report
+
+
+def check_watertight(report, file_path):
+    """Warn about a mesh that rays can leak out of."""
+    if not report.watertight:
+        warnings.warn(f"{file_path}: {report}", RuntimeWarning, stacklevel=3)
+
+
+def load_room(file_path, merge_coplanar=True):
+    """Load a mesh file once and preprocess it, warning if it is not watertight."""
+    mesh, geometry, report = preprocess(trimesh.load_mesh(file_path), merge_coplanar)
+    check_watertight(report, file_path)
+    return mesh, geometry, report
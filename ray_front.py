@@ -0,0 +1,130 @@
+import numpy as np
+import numpy.linalg as lin
+from path_store import PathStore
+from receivers import Receivers
+
+
+class RayFront:
+    """All traced segments of a set of rays, kept independent of any target.
+
+    Unlike ``MirrorImageMethod.trace_rays``, rays are not stopped when they
+    hit a target, so the same segments serve every receiver: moving the
+    target only repeats the receiver tests in ``paths_to``. The live front
+    after the last traced order is kept as well, so ``advance`` can trace
+    further orders without redoing the lower ones.
+    """
+
+    def __init__(self, room, origins, directions, energies, rng=None):
+        self.room = room
+        self.rng = rng
+        self.num_rays = len(origins)
+        self.order = -1
+        self.segments = []
+
+        # Zustand der noch aktiven Strahlen vor dem naechsten Schuss
+        self.origins = np.array(origins, dtype=float)
+        self.directions = np.array(directions, dtype=float)
+        self.directions /= lin.norm(self.directions, axis=1)[:, np.newaxis]
+        energies = np.atleast_1d(np.asarray(energies, dtype=float))
+        if energies.ndim == 1:
+            energies = energies[:, np.newaxis]
+        self.energies = np.array(np.broadcast_to(energies, (self.num_rays, room.materials.num_bands)))
+        self.travelled = np.zeros(self.num_rays)
+        self.active = np.arange(self.num_rays)
+        room.instrumentation.count("rays_traced", self.num_rays)
+
+    def advance(self, order):
+        """Trace the front through every order up to the given one."""
+        room = self.room
+        normals = room.geometry.normals
+        reflection = room.materials.reflection
+        for current_order in range(self.order + 1, order + 1):
+            self.order = current_order
+            if not self.active.size:
+                continue
+            origins, directions = self.origins, self.directions
+            locations, face_indices = room.shoot_rays(origins, directions)
+            hit_mesh = face_indices >= 0
+            origins, directions = origins[hit_mesh], directions[hit_mesh]
+            locations, face_indices = locations[hit_mesh], face_indices[hit_mesh]
+            active = self.active[hit_mesh]
+            energies, travelled = self.energies[hit_mesh], self.travelled[hit_mesh]
+
+            self.segments.append(
+                {
+                    "ray": active,
+                    "order": np.full(len(active), current_order),
+                    "origin": origins,
+                    "direction": directions,
+                    "reflection_point": locations,
+                    "face_index": face_indices,
+                    "energy": energies,
+                }
+            )
+
+            travelled = travelled + lin.norm(locations - origins, axis=1)
+            energies = energies * reflection[face_indices]
+            keep = np.ones(len(active), dtype=bool)
+            if room.energy_threshold is not None:
+                keep = room.survives_threshold(energies, travelled, self.rng)
+                room.instrumentation.count("rays_terminated", np.count_nonzero(~keep))
+
+            # Spiegelung der Richtung an der getroffenen Wand
+            face_normals = normals[face_indices[keep]]
+            directions = directions[keep]
+            self.directions = directions - 2 * np.einsum(
+                "ij,ij->i", directions, face_normals
+            )[:, np.newaxis] * face_normals
+            self.origins = locations[keep]
+            self.active = active[keep]
+            self.energies, self.travelled = energies[keep], travelled[keep]
+        return self
+
+    def paths_to(self, targets, max_order=None):
+        """Return one PathStore per target, using the segments up to max_order.
+
+        A ray's path to a target ends with the first segment that passes
+        through it, exactly as in ``trace_rays``.
+        """
+        room = self.room
+        max_order = self.order if max_order is None else max_order
+        if max_order > self.order:
+            raise ValueError(f"The front is only traced up to order {self.order}.")
+        if not self.segments:
+            return [PathStore.empty(room.order) for _ in targets]
+
+        columns = {
+            key: np.concatenate([batch[key] for batch in self.segments]) for key in self.segments[0]
+        }
+        if max_order < self.order:
+            within = columns["order"] <= max_order
+            columns = {key: column[within] for key, column in columns.items()}
+        room.instrumentation.count("target_tests", len(columns["ray"]) * len(targets))
+        with room.instrumentation.phase("target_tests"):
+            target_hits = Receivers.from_targets(targets).intersect(
+                columns["origin"],
+                columns["direction"],
+                lin.norm(columns["reflection_point"] - columns["origin"], axis=1),
+            )
+
+        hits = {"ray": [], "target": [], "order": [], "hit_location": []}
+        for target_id in range(len(targets)):
+            selected = np.flatnonzero(target_hits.receivers == target_id)
+            rows = target_hits.segments[selected]
+            # Zeilen sind nach Ordnung sortiert: der erste Treffer jedes Strahls zaehlt,
+            # und die Pfade werden wie in trace_rays nach Ordnung nummeriert
+            _, first = np.unique(columns["ray"][rows], return_index=True)
+            first = np.sort(first)
+            rows = rows[first]
+            hits["ray"].append(columns["ray"][rows])
+            hits["target"].append(np.full(len(rows), target_id))
+            hits["order"].append(columns["order"][rows])
+            hits["hit_location"].append(target_hits.closest_points[selected[first]])
+        hits = {key: np.concatenate(values) for key, values in hits.items()}
+        return [
+            room.paths_to_target(columns, hits, target_id, self.num_rays)
+            for target_id in range(len(targets))
+        ]
+
+    def __repr__(self):
+        return f"RayFront of {self.num_rays} rays traced up to order {self.order}."
@@ -0,0 +1,174 @@
+import numpy as np
+from acceleration import build_tree
+
+# From this many receivers on, segments are only tested against nearby receivers
+INDEX_THRESHOLD = 16
+
+
+def intersect_spheres(origins, directions, lengths, positions, radii):
+    """Test segment/sphere pairs.
+
+    Every segment starts at its origin and runs ``lengths`` along its unit
+    direction (``np.inf`` for a ray). Returns a boolean mask of the pairs
+    where the segment passes through the sphere, the distance along the
+    segment at which it enters the sphere (0 if it starts inside), and the
+    distance of the point of the segment closest to the sphere's center.
+    """
+    a = positions - origins
+    along = np.einsum("ij,ij->i", a, directions)
+    # Quadrierter Abstand des Mittelpunkts von der Geraden
+    squared = np.einsum("ij,ij->i", a, a) - along**2
+    half_chord = np.sqrt(np.maximum(radii**2 - squared, 0.0))
+    entry = along - half_chord
+    hit = (squared <= radii**2) & (along + half_chord >= 0) & (entry <= lengths)
+    return hit, np.maximum(entry, 0.0), np.clip(along, 0.0, lengths)
+
+
+class ReceiverHits:
+    """Segment/receiver pairs that intersect, sorted by segment and then receiver.
+
+    ``distances`` and ``entry_points`` give where each segment enters the
+    receiver sphere, ``closest_points`` the point of the segment closest to
+    the receiver's center.
+    """
+
+    def __init__(self, segments, receivers, distances, entry_points, closest_points):
+        self.segments = segments
+        self.receivers = receivers
+        self.distances = distances
+        self.entry_points = entry_points
+        self.closest_points = closest_points
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __repr__(self):
+        return f"ReceiverHits with {len(self)} segment/receiver pairs."
+
+
+class ReceiverIndex:
+    """Bounding volume hierarchy over the bounding boxes of receiver spheres.
+
+    Built with the same median split as the mesh BVH. ``candidates`` walks
+    the tree for a whole batch of segments and returns only the pairs whose
+    boxes overlap, so a segment is never tested against far-away receivers.
+    """
+
+    def __init__(self, positions, radii, leaf_size=4):
+        corners = np.stack(
+            (positions - radii[:, np.newaxis], positions + radii[:, np.newaxis]), axis=1
+        )
+        (
+            self.bounds_min,
+            self.bounds_max,
+            self.left,
+            self.right,
+            self.start,
+            self.count,
+            self.primitives,
+        ) = build_tree(corners, leaf_size)
+
+    def __len__(self):
+        return len(self.bounds_min)
+
+    def candidates(self, origins, directions, lengths):
+        """Return the segment and receiver indices of all pairs with overlapping boxes."""
+        inv_directions = 1.0 / np.where(directions == 0, 1e-300, directions)
+        segment_ids = np.arange(len(origins))
+        nodes = np.zeros(len(origins), dtype=np.int64)
+        pair_segments, pair_receivers = [], []
+
+        while segment_ids.size:
+            # Slab-Test, begrenzt auf das Segment bis zum Wandtreffer
+            t0 = (self.bounds_min[nodes] - origins[segment_ids]) * inv_directions[segment_ids]
+            t1 = (self.bounds_max[nodes] - origins[segment_ids]) * inv_directions[segment_ids]
+            t_near = np.minimum(t0, t1).max(axis=1)
+            t_far = np.maximum(t0, t1).min(axis=1)
+            keep = (t_far >= np.maximum(t_near, 0)) & (t_near <= lengths[segment_ids])
+            segment_ids, nodes = segment_ids[keep], nodes[keep]
+
+            leaf = self.count[nodes] > 0
+            leaf_segments, leaf_nodes = segment_ids[leaf], nodes[leaf]
+            if leaf_segments.size:
+                counts = self.count[leaf_nodes]
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                pair_segments.append(np.repeat(leaf_segments, counts))
+                pair_receivers.append(
+                    self.primitives[np.repeat(self.start[leaf_nodes], counts) + offsets]
+                )
+
+            inner_segments, inner_nodes = segment_ids[~leaf], nodes[~leaf]
+            segment_ids = np.concatenate((inner_segments, inner_segments))
+            nodes = np.concatenate((self.left[inner_nodes], self.right[inner_nodes]))
+
+        if not pair_segments:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(pair_segments), np.concatenate(pair_receivers)
+
+
+class Receivers:
+    """A set of spherical receivers, tested against batches of ray segments.
+
+    With ``use_index`` (by default from ``INDEX_THRESHOLD`` receivers on),
+    segments are matched to receivers through a ReceiverIndex, otherwise
+    every segment is tested against every receiver.
+    """
+
+    def __init__(self, positions, radii, use_index=None, leaf_size=4):
+        self.positions = np.atleast_2d(np.asarray(positions, dtype=float))
+        self.radii = np.broadcast_to(np.asarray(radii, dtype=float), len(self.positions)).copy()
+        if use_index is None:
+            use_index = len(self.positions) >= INDEX_THRESHOLD
+        self.index = ReceiverIndex(self.positions, self.radii, leaf_size) if use_index else None
+
+    @classmethod
+    def from_targets(cls, targets, use_index=None):
+        """Collect a list of Target spheres."""
+        return cls(
+            [target.position for target in targets],
+            [target.radius for target in targets],
+            use_index,
+        )
+
+    def __len__(self):
+        return len(self.positions)
+
+    def intersect(self, origins, directions, lengths=None):
+        """Test N segments against all receivers in one pass and return the ReceiverHits.
+
+        Directions must be unit vectors. Without lengths, the segments are
+        rays of infinite length.
+        """
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        if lengths is None:
+            lengths = np.full(len(origins), np.inf)
+        if self.index is not None:
+            segments, receivers = self.index.candidates(origins, directions, lengths)
+        else:
+            segments = np.repeat(np.arange(len(origins)), len(self))
+            receivers = np.tile(np.arange(len(self)), len(origins))
+
+        hit, entry, closest = intersect_spheres(
+            origins[segments],
+            directions[segments],
+            lengths[segments],
+            self.positions[receivers],
+            self.radii[receivers],
+        )
+        segments, receivers = segments[hit], receivers[hit]
+        entry, closest = entry[hit], closest[hit]
+        order = np.lexsort((receivers, segments))
+        segments, receivers = segments[order], receivers[order]
+        entry, closest = entry[order], closest[order]
+        return ReceiverHits(
+            segments,
+            receivers,
+            entry,
+            origins[segments] + entry[:, np.newaxis] * directions[segments],
+            origins[segments] + closest[:, np.newaxis] * directions[segments],
+        )
+
+    def __repr__(self):
+        indexed = "indexed" if self.index is not None else "unindexed"
+        return f"Receivers with {len(self)} spheres ({indexed})."
@@ -0,0 +1,149 @@
+from importlib.util import find_spec
+import numpy as np
+
+# "random" draws independent directions, the others cover the sphere more evenly.
+# "sobol" needs scipy and is only offered when it is installed.
+SAMPLERS = ("random", "fibonacci", "stratified", "halton")
+if find_spec("scipy") is not None:
+    SAMPLERS += ("sobol",)
+
+GOLDEN_ANGLE = np.pi * (3 - 5**0.5)
+
+
+def square_to_sphere(u, v):
+    """Map points of the unit square to unit directions with equal-area spacing."""
+    z = 2 * u - 1
+    t = 2 * np.pi * v
+    r = np.sqrt(np.clip(1 - z**2, 0.0, None))
+    return np.stack((r * np.cos(t), r * np.sin(t), z), axis=-1)
+
+
+def random_rotation(rng):
+    """Return a uniformly distributed random 3x3 rotation matrix."""
+    q = rng.normal(size=4)
+    w, x, y, z = q / np.linalg.norm(q)
+    return np.array(
+        [
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+        ]
+    )
+
+
+def random_directions(n, rng):
+    """n independent uniform directions."""
+    return square_to_sphere(rng.random(n), rng.random(n))
+
+
+def fibonacci_directions(n, rng=None):
+    """n directions on the Fibonacci sphere, randomly rotated if a generator is given."""
+    indices = np.arange(n) + 0.5
+    z = 1 - 2 * indices / n
+    t = GOLDEN_ANGLE * indices
+    r = np.sqrt(1 - z**2)
+    directions = np.stack((r * np.cos(t), r * np.sin(t), z), axis=-1)
+    if rng is not None:
+        directions = directions @ random_rotation(rng).T
+    return directions
+
+
+def stratified_directions(n, rng):
+    """n directions jittered inside a grid of equal-area cells.
+
+    The sphere is split into about sqrt(n) bands of equal height in z, each
+    band into as many azimuth cells as it gets samples, and every cell gets
+    one random sample. This works for any n.
+    """
+    rows = max(int(np.sqrt(n)), 1)
+    per_row = np.full(rows, n // rows)
+    per_row[: n % rows] += 1
+    row = np.repeat(np.arange(rows), per_row)
+    column = np.arange(n) - np.repeat(np.cumsum(per_row) - per_row, per_row)
+    u = (row + rng.random(n)) / rows
+    v = (column + rng.random(n)) / per_row[row]
+    return square_to_sphere(u, v)
+
+
+def radical_inverse(indices, base):
+    """Van der Corput radical inverse of non-negative integers in the given base."""
+    indices = np.asarray(indices, dtype=np.int64).copy()
+    result = np.zeros(len(indices))
+    scale = 1.0 / base
+    while indices.any():
+        result += (indices % base) * scale
+        indices //= base
+        scale /= base
+    return result
+
+
+def halton_directions(n, rng, start=0, shift=None):
+    """n directions from the Halton sequence in bases 2 and 3, starting at index start.
+
+    The points are shifted by a random offset modulo 1 (Cranley-Patterson
+    rotation), so batches with different generators are independent.
+    """
+    if shift is None:
+        shift = rng.random(2)
+    indices = np.arange(start, start + n) + 1
+    u = (radical_inverse(indices, 2) + shift[0]) % 1.0
+    v = (radical_inverse(indices, 3) + shift[1]) % 1.0
+    return square_to_sphere(u, v)
+
+
+def sobol_directions(n, rng):
+    """n directions from a scrambled Sobol sequence (requires scipy)."""
+    from scipy.stats import qmc
+
+    points = qmc.Sobol(d=2, scramble=True, seed=rng).random(n)
+    return square_to_sphere(points[:, 0], points[:, 1])
+
+
+def check_sampler(method):
+    """Raise a ValueError for a sampling method that is unknown or cannot run here."""
+    if method == "sobol" and method not in SAMPLERS:
+        raise ValueError(
+            "The sobol sampler needs scipy; install it with 'pip install scipy' "
+            "or use another sampler."
+        )
+    if method not in SAMPLERS:
+        raise ValueError(f"Unknown sampler {method!r}, expected one of {SAMPLERS}.")
+
+
+class DirectionSampler:
+    """Draws batches of unit directions of one sampling method from a seeded generator.
+
+    Consecutive batches of ``halton`` continue the same shifted sequence, and
+    ``fibonacci`` batches get a fresh random rotation, so repeated batches
+    never repeat the same directions.
+    """
+
+    def __init__(self, method="random", rng=None):
+        check_sampler(method)
+        self.method = method
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.drawn = 0
+        self._shift = None
+
+    def sample(self, n):
+        """Return the next n directions as an (n,3) array."""
+        rng = self.rng
+        if self.method == "random":
+            directions = random_directions(n, rng)
+        elif self.method == "fibonacci":
+            directions = fibonacci_directions(n, rng)
+        elif self.method == "stratified":
+            directions = stratified_directions(n, rng)
+        elif self.method == "halton":
+            if self._shift is None:
+                self._shift = rng.random(2)
+            directions = halton_directions(n, rng, self.drawn, self._shift)
+        else:
+            directions = sobol_directions(n, rng)
+        self.drawn += n
+        return directions
+
+
+def sample_directions(method, n, rng):
+    """Draw n directions of one sampling method from a seeded generator."""
+    return DirectionSampler(method, rng).sample(n)
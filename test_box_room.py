@@ -0,0 +1,70 @@
+import os
+import numpy as np
+import pytest
+from materials import OCTAVE_BANDS, MaterialTable
+from mirror_image_method import MirrorImageMethod
+from utils import Target
+
+MODEL_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+BOX_MESHES = ("simple_cube.obj", "cube5.obj", "rectbig.obj")
+
+
+def make_room(mesh, order, **kwargs):
+    """A room with source and target at fixed fractions of the bounds and random absorption."""
+    file_path = os.path.join(MODEL_DIRECTORY, mesh)
+    room = MirrorImageMethod(file_path, None, None, order, 1.0, 0, compute_paths=False, **kwargs)
+    low, high = room.mesh.bounds
+    room.set_source(low + (high - low) * np.array([0.3, 0.4, 0.35]))
+    radius = 0.1 * (high - low).min()
+    room.set_target(Target(low + (high - low) * np.array([0.7, 0.6, 0.65]), radius))
+    # Jedes Dreieck bekommt eine eigene Absorption, damit falsche Dreiecke auffallen
+    rng = np.random.default_rng(len(room.geometry))
+    room.materials = MaterialTable(rng.uniform(0.05, 0.5, (len(room.geometry), len(OCTAVE_BANDS))))
+    return room
+
+
+def sorted_paths(store):
+    """The segments of every path, sorted by order, faces and length."""
+    paths = []
+    for path_id in range(len(store)):
+        rows = store.segments["path"] == path_id
+        segments = store.segments[rows]
+        key = (len(segments) - 1, tuple(segments["face_index"].tolist()), segments["distance"].sum())
+        paths.append((key, segments, store.band_energy[rows]))
+    paths.sort(key=lambda path: path[0])
+    return paths
+
+
+def assert_same_paths(actual, expected, atol=1e-9):
+    actual, expected = sorted_paths(actual), sorted_paths(expected)
+    assert len(actual) == len(expected)
+    for (key, segments, band_energy), (expected_key, expected_segments, expected_band_energy) in zip(
+        actual, expected
+    ):
+        assert key[:2] == expected_key[:2]
+        for field in ("origin", "direction", "reflection_point", "hit_location", "distance"):
+            np.testing.assert_allclose(
+                segments[field], expected_segments[field], atol=atol, equal_nan=True
+            )
+        np.testing.assert_allclose(band_energy, expected_band_energy, atol=atol, equal_nan=True)
+
+
+@pytest.mark.parametrize("mesh", BOX_MESHES)
+@pytest.mark.parametrize("order", range(5))
+def test_lattice_matches_general_solver(mesh, order):
+    box = make_room(mesh, order)
+    general = make_room(mesh, order, analytic_box=False)
+    assert box.box is not None and general.box is None
+
+    assert_same_paths(box.calculate_image_source_paths(), general.calculate_image_source_paths())
+
+
+@pytest.mark.parametrize("mesh", BOX_MESHES)
+def test_box_backend_matches_bvh(mesh):
+    box = make_room(mesh, 3, ray_backend="box")
+    bvh = make_room(mesh, 3, ray_backend="bvh")
+
+    # Gleicher Seed, gleiche Richtungen; die BVH versetzt den Startpunkt minimal
+    actual, expected = box.trace_chunk(20000, 7), bvh.trace_chunk(20000, 7)
+    assert len(expected) > 0
+    assert_same_paths(actual, expected, atol=1e-4)
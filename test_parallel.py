@@ -0,0 +1,32 @@
+import os
+import numpy as np
+from mirror_image_method import MirrorImageMethod
+from utils import Target
+
+MODEL_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+
+
+def run(workers):
+    return MirrorImageMethod(
+        os.path.join(MODEL_DIRECTORY, "simple_cube.obj"),
+        np.array([0.123, 0.2, 0.113]),
+        Target(np.array([0.5, 0.5, 0.5]), 0.2),
+        2,
+        1.0,
+        5000,
+        workers=workers,
+        chunk_size=1024,
+        seed=1,
+        instrument=True,
+    )
+
+
+def test_worker_counters_are_merged():
+    serial, parallel = run(1), run(2)
+    assert len(serial.path_store) == len(parallel.path_store) > 0
+
+    counters, parallel_counters = serial.run_summary.counters, parallel.run_summary.counters
+    assert counters.keys() == parallel_counters.keys()
+    assert counters["rays_shot"] == parallel_counters["rays_shot"]
+    assert counters["rays_traced"] == parallel_counters["rays_traced"] == 5000
+    assert serial.run_summary.timings.keys() == parallel.run_summary.timings.keys()
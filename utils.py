@@ -1,5 +1,7 @@
 import numpy.linalg as lin
 import numpy as np
+from sampling import random_directions
+from receivers import Receivers, intersect_spheres
 
 class Ray:
     """A ray object that can be shot from a source."""
@@ -25,16 +27,13 @@ class Ray:
         return directions
     
     #Powered by ChatGPT
-    def generate_random_rays(origin, n, initial_energy=1.0):
-        """Generate n random rays in a hemisphere with specified initial energy."""
-        z = 2 * np.random.rand(n) - 1
-        t = 2 * np.pi * np.random.rand(n)
-        r = np.sqrt(1 - z**2)
-
-        x = r * np.cos(t)
-        y = r * np.sin(t)
+    def generate_random_directions(n, rng=None):
+        """Generate n random unit directions on the sphere as an (n,3) array."""
+        return random_directions(n, np.random.default_rng() if rng is None else rng)
 
-        directions = np.stack((x, y, z), axis=-1)
+    def generate_random_rays(origin, n, initial_energy=1.0, rng=None):
+        """Generate n random rays in a hemisphere with specified initial energy."""
+        directions = Ray.generate_random_directions(n, rng)
         return [Ray(origin, direction, initial_energy) for direction in directions]
     
     def reflect(self, reflection_coefficient):
@@ -51,31 +50,52 @@ class Target:
         self.position = position
         self.radius = radius
 
-    def is_hitted_by_ray(self, ray: Ray):
-        """Check if a ray hits the target."""
-        #Verbindung zwischen Startpunkt Ray und Zentrum der Kugel
-        a = self.position - ray.origin
-        u = np.dot(a, ray.direction) / np.dot(ray.direction, ray.direction)
-        p = ray.origin + u * ray.direction
-        
-        d = self.position - p
-        hit = lin.norm(d) <= self.radius
-        if hit:
-            ray.hit_location = p
-        return hit
-    
+    def is_hitted_by_ray(self, ray: Ray, length=np.inf):
+        """Check if a ray (up to length) hits the target."""
+        hit, locations = self.is_hitted_by_rays(
+            ray.origin[np.newaxis], ray.direction[np.newaxis], np.array([length])
+        )
+        if hit[0]:
+            ray.hit_location = locations[0]
+        return bool(hit[0])
+
     def set_hit_location(self, ray: Ray):
         """Set the hit location of the ray on the target."""
-        a = self.position - ray.origin
-        u = np.dot(a, ray.direction) / np.dot(ray.direction, ray.direction)
-        p = ray.origin + u * ray.direction
-        ray.hit_location = p
+        _, _, along = intersect_spheres(
+            ray.origin[np.newaxis],
+            ray.direction[np.newaxis],
+            np.array([np.inf]),
+            np.asarray(self.position, dtype=float)[np.newaxis],
+            np.array([self.radius]),
+        )
+        ray.hit_location = ray.origin + along[0] * ray.direction
+
+    def is_hitted_by_rays(self, origins, directions, lengths=None):
+        """Check a batch of rays or segments against the target.
+
+        Returns a boolean mask of the rays that pass through the target in
+        their direction of travel (within lengths, if given) and the points
+        of the rays closest to the target, NaN for rays that miss.
+        """
+        origins = np.asarray(origins, dtype=float)
+        directions = np.asarray(directions, dtype=float)
+        directions = directions / lin.norm(directions, axis=1)[:, np.newaxis]
+        hits = Receivers([self.position], [self.radius], use_index=False).intersect(
+            origins, directions, lengths
+        )
+        hit = np.zeros(len(origins), dtype=bool)
+        hit[hits.segments] = True
+        points = np.full((len(origins), 3), np.nan)
+        points[hits.segments] = hits.closest_points
+        return hit, points
+
     def generate_random_coordinates():
         """Generate random coordinates in a unit cube."""
         x = np.random.uniform(*(0,5))
         y = np.random.uniform(*(0,5))
         z = np.random.uniform(*(0,5))
         return np.array([x, y, z])
+
 class SoundPath:
     """A path of sound rays."""
     def __init__(self):
@@ -90,8 +110,7 @@ class SoundPath:
         if hit_location is not None:
             distance = lin.norm(origin - hit_location)
 
-        ray = Ray(origin, direction, energy)
-        ray.apply_energy_loss(distance)
+        energy_loss = energy / distance**2 if distance > 0 else 0.0
         self.travelPath.append({
             "origin": origin,
             "direction": direction,
@@ -99,8 +118,8 @@ class SoundPath:
             "order": order, 
             "distance": distance,
             "face_index": face_index,
-            "energy": ray.energy,
-            "energy_loss":  ray.energy_loss,
+            "energy": energy,
+            "energy_loss": energy_loss,
             "hit_location": hit_location
         })
 
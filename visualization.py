@@ -1,18 +1,35 @@
+import os
 import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
 from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
 import numpy as np
 from utils import Target
 import matplotlib.cm as cm
 
+# Above this many paths, plot_reflections draws an evenly spaced subset
+DEFAULT_MAX_PATHS = 2000
+
 
 class MeshVisualizer:
-    def __init__(self, room, target_face=-1):
+    def __init__(self, room, target_face=-1, verbose=False, max_paths=DEFAULT_MAX_PATHS):
         self.room = room
         self.target_face = target_face
+        self.verbose = verbose
+        self.max_paths = max_paths
+
+    def new_figure(self, off_screen):
+        """Create a figure, detached from pyplot when rendering off-screen."""
+        return Figure() if off_screen else plt.figure()
+
+    def plot_mesh(self, output=None):
+        """Plot the mesh.
 
-    def plot_mesh(self):
-        """Plot the mesh."""
-        fig = plt.figure()
+        With an output file the figures are rendered off-screen and saved,
+        the impulse response next to it with a ``_response`` suffix.
+        """
+        fig = self.new_figure(output is not None)
         ax = fig.add_subplot(111, projection="3d")
 
         #Auskommentieren wenn Rechteck als Mesh verwendet wird
@@ -28,14 +45,21 @@ class MeshVisualizer:
         else:
             self.plot_faces(ax)
         self.plot_target(ax)
-        self.plot_response()
+        if output is None:
+            self.plot_response()
+        else:
+            root, extension = os.path.splitext(output)
+            self.plot_response(f"{root}_response{extension}")
 
         # plot the faces with their index
         # self.identify_faces(ax)
         ax.set_axis_off()
-        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+        fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
         ax.set_title("3D Points Plot")
-        plt.show()
+        if output is None:
+            plt.show()
+        else:
+            fig.savefig(output)
 
     def plot_vertices(self, ax):
         """Plot the vertices of the mesh."""
@@ -53,63 +77,60 @@ class MeshVisualizer:
             color="blue",
         )
 
+    def face_edges(self):
+        """Return the three edges of every face as an (F*3, 2, 3) segment array."""
+        triangles = self.room.geometry.triangles
+        return np.stack((triangles, np.roll(triangles, -1, axis=1)), axis=2).reshape(-1, 2, 3)
+
+    def plot_edges(self, ax, colors):
+        """Draw all face edges as one collection, with one RGBA color per face."""
+        ax.add_collection3d(
+            Line3DCollection(self.face_edges(), colors=np.repeat(colors, 3, axis=0))
+        )
+
     def plot_faces(self, ax):
         """Plot the faces of the mesh."""
-        mesh = self.room.mesh
-        for index, face in enumerate(mesh.faces):
-            for i in range(3):
-                ax.plot(
-                    [mesh.vertices[face[i], 0], mesh.vertices[face[(i + 1) % 3], 0]],
-                    [mesh.vertices[face[i], 1], mesh.vertices[face[(i + 1) % 3], 1]],
-                    [mesh.vertices[face[i], 2], mesh.vertices[face[(i + 1) % 3], 2]],
-                    c="black",
-                    alpha=0.1,
-                )
-            mirrored_ps = self.room.mirror_source(self.room.source, face)
-            ax.scatter(mirrored_ps[0], mirrored_ps[1], mirrored_ps[2], c="pink")
+        num_faces = len(self.room.geometry)
+        self.plot_edges(ax, np.tile(to_rgba("black", 0.1), (num_faces, 1)))
+        mirrored_ps = self.mirrored_sources()
+        ax.scatter(mirrored_ps[:, 0], mirrored_ps[:, 1], mirrored_ps[:, 2], c="pink")
 
     def plot_highlighted_target_face(self, ax):
         """Plot the faces of the mesh."""
-        mesh = self.room.mesh
-        for index, face in enumerate(mesh.faces):
-            color = "black" if index != self.target_face else "red"
-            for i in range(3):
-                ax.plot(
-                    [mesh.vertices[face[i], 0], mesh.vertices[face[(i + 1) % 3], 0]],
-                    [mesh.vertices[face[i], 1], mesh.vertices[face[(i + 1) % 3], 1]],
-                    [mesh.vertices[face[i], 2], mesh.vertices[face[(i + 1) % 3], 2]],
-                    c=color,
-                    alpha=0.1 if index != self.target_face else 1.0,
-                )
-            mirrored_ps = self.room.mirror_source(self.room.source, face)
-            ax.scatter(
-                mirrored_ps[0],
-                mirrored_ps[1],
-                mirrored_ps[2],
-                c="pink" if index != self.target_face else "orange",
-            )
+        num_faces = len(self.room.geometry)
+        colors = np.tile(to_rgba("black", 0.1), (num_faces, 1))
+        colors[self.target_face] = to_rgba("red", 1.0)
+        self.plot_edges(ax, colors)
+        mirrored_ps = self.mirrored_sources()
+        ax.scatter(
+            mirrored_ps[:, 0],
+            mirrored_ps[:, 1],
+            mirrored_ps[:, 2],
+            c=[
+                "pink" if index != self.target_face else "orange"
+                for index in range(len(mirrored_ps))
+            ],
+        )
+
+    def mirrored_sources(self):
+        """Mirror the source across every face of the mesh at once."""
+        num_faces = len(self.room.geometry)
+        return self.room.mirror_sources(
+            np.tile(self.room.source, (num_faces, 1)), np.arange(num_faces)
+        )
 
     def identify_faces(self, ax):
         """Colors the faces and labels them with their index."""
-        mesh = self.room.mesh
-        num_faces = len(mesh.faces)
-        colors = plt.get_cmap("tab20", num_faces)
-
-        for index, face in enumerate(mesh.faces):
-            color = colors(index / num_faces)
-            for i in range(3):
-                ax.plot(
-                    [mesh.vertices[face[i], 0], mesh.vertices[face[(i + 1) % 3], 0]],
-                    [mesh.vertices[face[i], 1], mesh.vertices[face[(i + 1) % 3], 1]],
-                    [mesh.vertices[face[i], 2], mesh.vertices[face[(i + 1) % 3], 2]],
-                    c=color,
-                    alpha=0.6 if index != self.target_face else 1.0,
-                )
+        num_faces = len(self.room.geometry)
+        colors = plt.get_cmap("tab20", num_faces)(np.arange(num_faces) / num_faces)
+        colors[:, 3] = np.where(np.arange(num_faces) != self.target_face, 0.6, 1.0)
+        self.plot_edges(ax, colors)
 
-            centroid = self.room.centroid_of_face(face)
-            ax.text(centroid[0], centroid[1], centroid[2], str(index), color=color)
-            mirrored_ps = self.room.mirror_source(self.room.source, face)
-            ax.scatter(mirrored_ps[0], mirrored_ps[1], mirrored_ps[2], color=color)
+        centroids = self.room.geometry.centroids
+        for index, centroid in enumerate(centroids):
+            ax.text(centroid[0], centroid[1], centroid[2], str(index), color=colors[index])
+        mirrored_ps = self.mirrored_sources()
+        ax.scatter(mirrored_ps[:, 0], mirrored_ps[:, 1], mirrored_ps[:, 2], color=colors)
 
     def plot_image_sources(self, ax):
         """Plot the image sources."""
@@ -117,12 +138,11 @@ class MeshVisualizer:
         ps = self.room.source
 
         if 0 <= self.target_face < len(mesh.faces):
-            face = mesh.faces[self.target_face]
-            center = self.room.centroid_of_face(face)
+            center = self.room.centroid_of_face(self.target_face)
             r = center - ps
-            normal = self.room.calculate_normal(face)
+            normal = self.room.calculate_normal(self.target_face)
             orthogonal = np.dot(r, normal) * normal
-            mirrored_source = self.room.mirror_source(ps, face)
+            mirrored_source = self.room.mirror_source(ps, self.target_face)
 
             self.plot_vector(ax, ps, r, "green", "R")
             self.plot_vector(ax, center, normal, "red", "n")
@@ -175,15 +195,51 @@ class MeshVisualizer:
         ax.plot_surface(x, y, z, color="blue", alpha=1)
 
     def plot_reflections(self, ax):
-        """Plot reflection paths."""
-        paths_dict = self.room.paths
-        total_paths = sum(len(paths) for paths in paths_dict.values())
-        print("-" * 80)
-        print(f"{total_paths} paths found.")
+        """Plot reflection paths.
+
+        All segments go into one line collection colored by path order, and
+        the reflection points of each order into one scatter. Above
+        max_paths paths an evenly spaced subset is drawn.
+        """
+        store = self.room.path_store
+        if self.verbose:
+            self.print_paths()
 
         order_colors = ["blue", "red", "green", "purple", "orange", "cyan", "magenta"]
         hit_colors = ["red", "green", "purple", "orange", "cyan", "magenta", "blue"]
 
+        if self.max_paths is not None and len(store) > self.max_paths:
+            store = store.select(np.linspace(0, len(store) - 1, self.max_paths).astype(np.int64))
+        if not len(store):
+            return
+
+        segments = store.segments
+        path_orders = store.path_orders()[segments["path"]]
+        hit = ~np.isnan(segments["hit_location"]).any(axis=1)
+        ends = np.where(hit[:, np.newaxis], segments["hit_location"], segments["reflection_point"])
+        colors = [to_rgba(order_colors[order % len(order_colors)]) for order in range(store.max_order + 1)]
+        ax.add_collection3d(
+            Line3DCollection(
+                np.stack((segments["origin"], ends), axis=1),
+                colors=np.array(colors)[path_orders],
+            )
+        )
+        for order in range(store.max_order + 1):
+            points = segments["reflection_point"][~hit & (path_orders == order)]
+            if len(points):
+                ax.scatter(
+                    points[:, 0],
+                    points[:, 1],
+                    points[:, 2],
+                    c=hit_colors[order % len(hit_colors)],
+                )
+
+    def print_paths(self):
+        """Print the travel time, energy loss and rays of every path."""
+        paths_dict = self.room.paths
+        total_paths = sum(len(paths) for paths in paths_dict.values())
+        print("-" * 80)
+        print(f"{total_paths} paths found.")
         for order, paths in paths_dict.items():
             for path in paths:
                 travel_time = path.calculate_total_travel_time()
@@ -194,42 +250,9 @@ class MeshVisualizer:
                 print("=" * 80)
                 for ray_info in path.travelPath:
                     self.print_ray_info(ray_info)
-                    self.plot_ray(
-                        ax,
-                        ray_info,
-                        order_colors[order % len(order_colors)],
-                        hit_colors[order % len(hit_colors)],
-                    )
-
         if not any(paths_dict.values()):
             print("No rays hit the target.")
 
-    def plot_ray(self, ax, ray_info, color, hit_color):
-        """Plot individual rays."""
-        origin = ray_info["origin"]
-        reflection_point = ray_info["reflection_point"]
-        hit_location = ray_info["hit_location"]
-        if hit_location is not None:
-            ax.plot(
-                [origin[0], hit_location[0]],
-                [origin[1], hit_location[1]],
-                [origin[2], hit_location[2]],
-                color=color,
-            )
-        else:
-            ax.scatter(
-                reflection_point[0],
-                reflection_point[1],
-                reflection_point[2],
-                c=hit_color,
-            )
-            ax.plot(
-                [origin[0], reflection_point[0]],
-                [origin[1], reflection_point[1]],
-                [origin[2], reflection_point[2]],
-                color=color,
-            )
-
     def print_ray_info(self, ray_info):
         """Print ray information."""
         origin = ray_info["origin"]
@@ -254,45 +277,41 @@ class MeshVisualizer:
 
         print("-" * 40)
 
-    def plot_response(self):
-        """Plot the Room Impulse Response."""
-        early_energy = []
-        early_time = []
-        direct_energy = []
-        direct_time = []
+    def plot_response(self, output=None):
+        """Plot the Room Impulse Response, or render it off-screen into a file."""
+        store = self.room.path_store
+        times = store.calculate_total_travel_time()
+        energies = store.calculate_energy_loss_of_all()
+        orders = store.path_orders()
+        if self.verbose:
+            for order, path_ids in store.group_by_order().items():
+                print(f"\nPaths with {order} reflections: {len(path_ids)}")
 
-        for order, paths in self.room.paths.items():
-            print(f"\nPaths with {order} reflections: {len(paths)}")
-            for path in paths:
-                if order == 0:
-                    direct_time.append(path.calculate_total_travel_time())
-                    direct_energy.append(path.calculate_energy_loss_of_all())
-                    continue
-                early_time.append(path.calculate_total_travel_time())
-                early_energy.append(path.calculate_energy_loss_of_all())
-
-        plt.figure()
-        if direct_energy and direct_time:
-            plt.stem(
-                direct_time,
-                direct_energy,
+        direct = orders == 0
+        fig = self.new_figure(output is not None)
+        ax = fig.add_subplot(111)
+        if direct.any():
+            ax.stem(
+                times[direct],
+                energies[direct],
                 linefmt="b-",
                 markerfmt="bo",
                 basefmt="k-",
                 label="Direct Path",
             )
-        if early_energy and early_time:
-            plt.stem(
-                early_time,
-                early_energy,
+        if (~direct).any():
+            ax.stem(
+                times[~direct],
+                energies[~direct],
                 linefmt="r-",
                 markerfmt="ro",
                 basefmt="k-",
                 label="Early Reflections",
             )
-        plt.xlabel("Time")
-        plt.ylabel("Energy")
-        plt.title("Room Impulse Response")
-        plt.grid(True)
-        plt.legend(loc="upper right")
-        
\ No newline at end of file
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Energy")
+        ax.set_title("Room Impulse Response")
+        ax.grid(True)
+        ax.legend(loc="upper right")
+        if output is not None:
+            fig.savefig(output)